@@ -1,148 +1,211 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from random import randint
-import io
+import os
+import tempfile
+import time
+import uuid
+
+from banco import ArmazemBancos, BancoVagas, ConsultaBanco, importar_para_banco
+from dados import (
+    DIMENSOES, ESCALAS_DADOS_FICTICIOS, FORMATOS_EXPORTACAO, SEMENTE_PADRAO,
+    CuboAgregacao, DiferencaVersoes, HierarquiaFiltros, RegistroDados,
+    TarefaImportacao, calcular_hash_conteudo, exportar_dados, formatar_bytes, gerar_dados_ficticios,
+    importar_planilha, posicoes_ordenadas, resumo_estatistico, tamanho_em_bytes,
+)
+from graficos import (
+    CacheFiguras, figura_barras, figura_barras_empilhadas, figura_diferencas,
+    figura_mapa_calor, figura_pizza_cargo, figura_pizza_regiao, figura_treemap,
+)
+from instrumentacao import MedicaoExecucao, RegistroTempos
 
 # ---------- CONFIGURAÇÃO DA PÁGINA ----------
 st.set_page_config(page_title="Vagas Saúde TO", layout="wide")
 
-# ---------- FUNÇÃO PARA CARREGAR DADOS (FICTÍCIOS OU IMPORTADOS) ----------
-@st.cache_data
-def gerar_dados_ficticios():
-    """Gera dados fictícios para o protótipo"""
-    
-    # Municípios com hospitais estaduais (17 unidades)
-    municipios = [
-        "Palmas", "Araguaína", "Gurupi", "Porto Nacional", "Paraíso do Tocantins",
-        "Arraias", "Pedro Afonso", "Guaraí", "Dianópolis", "Alvorada",
-        "Miracema do Tocantins", "Xambioá", "Arapoema", "Araguaçu", "Augustinópolis"
-    ]
-
-    # 8 REGIÕES DE SAÚDE OFICIAIS DO TOCANTINS (PDR 2014)
-    regioes_saude = [
-        "Bico do Papagaio",
-        "Médio Norte Araguaia",
-        "Cerrado Tocantins Araguaia",
-        "Cantão",
-        "Capim Dourado",
-        "Amor Perfeito",
-        "Ilha do Bananal",
-        "Sudeste"
-    ]
-
-    # Mapeamento município -> região
-    municipio_regiao = {
-        "Palmas": "Capim Dourado",
-        "Porto Nacional": "Amor Perfeito",
-        "Paraíso do Tocantins": "Cantão",
-        "Miracema do Tocantins": "Capim Dourado",
-        "Araguaína": "Médio Norte Araguaia",
-        "Xambioá": "Médio Norte Araguaia",
-        "Arapoema": "Cerrado Tocantins Araguaia",
-        "Pedro Afonso": "Cerrado Tocantins Araguaia",
-        "Guaraí": "Médio Norte Araguaia",
-        "Gurupi": "Ilha do Bananal",
-        "Alvorada": "Ilha do Bananal",
-        "Araguaçu": "Ilha do Bananal",
-        "Dianópolis": "Sudeste",
-        "Arraias": "Sudeste",
-        "Augustinópolis": "Bico do Papagaio"
-    }
-
-    # Dicionário com os nomes dos hospitais
-    hospitais_por_municipio = {
-        "Palmas": [
-            "Hospital Geral de Palmas (HGP) - com ala pediátrica", 
-            "Hospital e Maternidade Dona Regina"
-        ],
-        "Araguaína": ["Hospital Regional de Araguaína", "Hospital Materno Infantil Tia Dedé"],
-        "Gurupi": ["Hospital Regional de Gurupi"],
-        "Porto Nacional": ["Hospital Regional de Porto Nacional"],
-        "Paraíso do Tocantins": ["Hospital Regional de Paraíso do Tocantins"],
-        "Augustinópolis": ["Hospital Regional de Augustinópolis"],
-        "Dianópolis": ["Hospital Regional de Dianópolis"],
-        "Arraias": ["Hospital Regional de Arraias"],
-        "Guaraí": ["Hospital Regional de Guaraí"],
-        "Pedro Afonso": ["Hospital Regional de Pedro Afonso"],
-        "Miracema do Tocantins": ["Hospital Regional de Miracema"],
-        "Xambioá": ["Hospital Regional de Xambioá"],
-        "Alvorada": ["Hospital Regional de Alvorada"],
-        "Araguaçu": ["Hospital Regional de Araguaçu"],
-        "Arapoema": ["Hospital e Maternidade Irmã Rita"]
-    }
-
-    # Cargos conforme Lei 2.670/2012
-    cargos = [
-        "Analista em Controle de Zoonoses", "Assistente Social", "Biólogo em Saúde",
-        "Biomédico", "Enfermeiro", "Farmacêutico", "Farmacêutico-Bioquímico",
-        "Fonoaudiólogo", "Nutricionista", "Psicólogo", "Tecnólogo",
-        "Cirurgião-Dentista", "Médico", "Fisioterapeuta", "Terapeuta Ocupacional",
-        "Administrador Hospitalar", "Auditor em Saúde", "Engenheiro Clínico",
-        "Executivo em Saúde", "Inspetor em Vigilância Sanitária",
-        "Pesquisador Docente em Saúde Pública", "Gestor em Saúde", "Físico",
-        "Instrumentador Cirúrgico", "Técnico em Imobilização Ortopédica",
-        "Técnico de Saúde Bucal", "Técnico em Enfermagem", "Técnico em Laboratório",
-        "Técnico em Radiologia", "Assistente de Serviços de Saúde",
-        "Auxiliar de Serviços de Saúde", "Auxiliar de Enfermagem", "Auxiliar de Laboratório"
-    ]
-
-    # Gerar dados
-    dados = []
-    for municipio in municipios:
-        regiao = municipio_regiao[municipio]
-        hospitais = hospitais_por_municipio[municipio]
-        
-        if municipio in ["Palmas", "Araguaína", "Gurupi"]:
-            max_vagas = 25
-        elif municipio in ["Porto Nacional", "Paraíso do Tocantins", "Augustinópolis"]:
-            max_vagas = 15
-        else:
-            max_vagas = 10
-            
-        for hospital in hospitais:
-            for cargo in cargos:
-                if cargo in ["Médico", "Enfermeiro", "Técnico em Enfermagem"]:
-                    vagas = randint(2, max_vagas)
-                elif cargo in ["Auxiliar de Enfermagem", "Auxiliar de Laboratório"]:
-                    vagas = randint(0, 3)
-                elif cargo in ["Gestor em Saúde", "Executivo em Saúde", "Pesquisador Docente em Saúde Pública"]:
-                    vagas = randint(0, 2)
-                else:
-                    vagas = randint(0, max_vagas//2)
-                    
-                if vagas > 0:
-                    dados.append([municipio, regiao, hospital, cargo, vagas])
+# ---------- CONFIGURAÇÕES ----------
+# Limite de memória dos conjuntos de dados e dos seus índices de filtros,
+# somando todas as sessões (em MB). Fora da conta: hierarquias e cubos (bem
+# menores) e o conjunto atual de cada sessão, com seu índice, que segue em uso
+# por ela mesmo depois de descartado do registro
+LIMITE_MEMORIA_DADOS = int(os.environ.get("VAGAS_LIMITE_MEMORIA_MB", 1024)) * 1024 * 1024
 
-    return pd.DataFrame(dados, columns=["Município", "Região de Saúde", "Hospital", "Cargo", "Vagas"])
+# As sessões recebem visões rasas dos conjuntos compartilhados; o Copy-on-Write
+# (padrão a partir do pandas 3) impede que uma alteração passe para as outras
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
 
-# ---------- FUNÇÃO PARA VALIDAR DADOS IMPORTADOS ----------
-def validar_dados_importados(df):
-    """Verifica se o DataFrame importado tem a estrutura correta"""
-    
-    colunas_esperadas = ["Município", "Região de Saúde", "Hospital", "Cargo", "Vagas"]
-    colunas_recebidas = df.columns.tolist()
-    
-    # Verificar se todas as colunas esperadas existem
-    for col in colunas_esperadas:
-        if col not in colunas_recebidas:
-            return False, f"Coluna '{col}' não encontrada. Colunas encontradas: {colunas_recebidas}"
-    
-    # Verificar se há dados
-    if df.empty:
-        return False, "O arquivo está vazio"
-    
-    # Verificar se a coluna Vagas é numérica
-    if not pd.api.types.is_numeric_dtype(df["Vagas"]):
-        return False, "A coluna 'Vagas' deve conter apenas números"
-    
-    # Verificar se há valores negativos
-    if (df["Vagas"] < 0).any():
-        return False, "A coluna 'Vagas' não pode conter valores negativos"
+# Pasta opcional para guardar cópias em Parquet (requer pyarrow)
+DIRETORIO_CACHE_PARQUET = os.environ.get("VAGAS_CACHE_PARQUET")
+
+# Pasta opcional para gravar as planilhas importadas em SQLite: filtros e
+# agregações passam a ser consultas no banco e os dados não ficam na memória
+DIRETORIO_BANCO_SQLITE = os.environ.get("VAGAS_BANCO_SQLITE")
+
+# Quantidade máxima de figuras guardadas (compartilhadas entre sessões)
+LIMITE_CACHE_FIGURAS = 256
+
+TAMANHOS_PAGINA = [25, 50, 100, 500, 1000]
+
+# Acima deste número de linhas a tabela abre na visão agregada
+LIMITE_LINHAS_DETALHADAS = 50_000
+
+# Máximo de chaves alteradas listadas na comparação entre versões
+LIMITE_LINHAS_ALTERACOES = 1000
+
+# Importação em segundo plano: espera inicial (planilhas pequenas ou já lidas
+# aparecem direto) e intervalo de atualização da barra de progresso, em segundos
+ESPERA_IMPORTACAO = 0.3
+INTERVALO_PROGRESSO_IMPORTACAO = 0.5
+
+# Painel de desempenho: aparece só com ?admin=<token> na URL
+TOKEN_ADMIN = os.environ.get("VAGAS_ADMIN_TOKEN")
+
+# Arquivo opcional onde cada tempo medido é anexado como uma linha JSON
+ARQUIVO_LOG_TEMPOS = os.environ.get("VAGAS_LOG_TEMPOS")
+
+# ---------- CACHES DA APLICAÇÃO ----------
+@st.cache_resource
+def obter_registro_dados():
+    """Conjuntos de dados do processo: cada planilha é lida uma vez para todas as sessões"""
+    return RegistroDados(LIMITE_MEMORIA_DADOS, DIRETORIO_CACHE_PARQUET)
+
+def carregar_dados_ficticios(semente, escala):
+    """Dados fictícios da escala escolhida, gerados uma vez por processo"""
+    df, _ = obter_registro_dados().obter_ou_criar(
+        f"ficticios:{semente}:{escala}",
+        lambda: (gerar_dados_ficticios(semente, **ESCALAS_DADOS_FICTICIOS[escala]), {}),
+        persistir=False
+    )
+    return df
+
+@st.cache_resource
+def obter_armazem_bancos():
+    """Bancos SQLite das planilhas importadas, compartilhados por todas as sessões"""
+    return ArmazemBancos(DIRETORIO_BANCO_SQLITE)
+
+def iniciar_importacao(chave_arquivo, conteudo, nome_arquivo):
+    """Lê a planilha numa thread, sem travar o painel.
+
+    Planilhas já lidas por qualquer sessão vêm do registro (ou do banco) sem
+    novo parsing. O resultado é (df, banco, relatorio_erros, mensagem).
+    """
+    if DIRETORIO_BANCO_SQLITE:
+        armazem = obter_armazem_bancos()
+        
+        def executar(progresso, cancelamento):
+            # Planilha gravada em SQLite: só resultados agregados passam pela memória
+            banco_lido, relatorio, mensagem = armazem.obter_ou_criar(
+                chave_arquivo,
+                lambda caminho: importar_para_banco(caminho, conteudo, nome_arquivo, progresso, cancelamento=cancelamento)
+            )
+            return None, banco_lido, relatorio, mensagem
+    else:
+        registro = obter_registro_dados()
+        
+        def executar(progresso, cancelamento):
+            def ler_planilha():
+                df_lido, relatorio, mensagem = importar_planilha(conteudo, nome_arquivo, progresso, cancelamento=cancelamento)
+                return df_lido, {"relatorio_erros": relatorio, "mensagem": mensagem}
+            
+            df_lido, info = registro.obter_ou_criar(chave_arquivo, ler_planilha)
+            return df_lido, None, info.get("relatorio_erros"), info.get("mensagem", "Dados válidos")
     
-    return True, "Dados válidos"
+    importacao = TarefaImportacao(chave_arquivo, nome_arquivo, executar)
+    importacao.aguardar(ESPERA_IMPORTACAO)
+    return importacao
+
+def obter_importada(chave_arquivo):
+    """(df, banco) de uma planilha já importada, se ainda estiver disponível"""
+    if DIRETORIO_BANCO_SQLITE:
+        return None, obter_armazem_bancos().obter(chave_arquivo)[0]
+    return obter_registro_dados().obter(chave_arquivo)[0], None
+
+@st.fragment(run_every=INTERVALO_PROGRESSO_IMPORTACAO)
+def acompanhar_importacao(importacao):
+    """Progresso da leitura em segundo plano; ao terminar, o app roda de novo com os dados novos"""
+    if importacao.concluida:
+        st.rerun()
+    linhas = f"{importacao.linhas_lidas:,}".replace(",", ".")
+    st.progress(importacao.fracao(), text=f"📥 Lendo {importacao.nome_arquivo}: {linhas} linhas")
+    if st.button("✖️ Cancelar importação", key="cancelar_importacao"):
+        importacao.cancelar()
+        st.rerun()
+
+@st.cache_resource(max_entries=8)
+def obter_hierarquia_filtros(chave_dados, _dados):
+    """Hierarquia dos filtros, construída uma vez por conjunto de dados (DataFrame ou banco)"""
+    if isinstance(_dados, BancoVagas):
+        return _dados.hierarquia()
+    return HierarquiaFiltros(_dados)
+
+def obter_indice_filtros(chave_dados, df):
+    """Índice dos filtros, construído uma vez por conjunto de dados e guardado junto com ele no registro"""
+    # A sessão guarda o do conjunto em uso (o registro pode não caber um conjunto grande demais)
+    em_cache = st.session_state.get("indice_filtros")
+    if em_cache is None or em_cache[0] != chave_dados:
+        em_cache = (chave_dados, obter_registro_dados().indice_filtros(chave_dados, df))
+        st.session_state["indice_filtros"] = em_cache
+    return em_cache[1]
+
+@st.cache_resource(max_entries=4)
+def obter_diferenca_versoes(chave_anterior, chave_nova, _anterior, _nova):
+    """Diferença entre duas versões da planilha, calculada uma vez por par"""
+    return DiferencaVersoes(_anterior, _nova)
+
+def obter_cubo(chave_filtros, df_filtrado, diferenca=None, chave_anterior=None):
+    """Cubo do estado de filtros atual; só é recalculado quando os filtros mudam.
+
+    Quando chega uma nova versão da planilha com os mesmos filtros, o cubo da
+    versão anterior é atualizado só com as linhas alteradas.
+    """
+    em_cache = st.session_state.get("cubo_agregacao")
+    if em_cache is None or em_cache[0] != chave_filtros:
+        if isinstance(df_filtrado, ConsultaBanco):
+            cubo = df_filtrado.cubo()
+        elif diferenca is not None and em_cache is not None and em_cache[0] == (chave_anterior,) + chave_filtros[1:]:
+            cubo = em_cache[1].com_delta(*diferenca.linhas_alteradas(dict(chave_filtros[1:])))
+        else:
+            cubo = CuboAgregacao(df_filtrado)
+        em_cache = (chave_filtros, cubo)
+        st.session_state["cubo_agregacao"] = em_cache
+    return em_cache[1]
+
+def obter_ordem_tabela(chave_filtros, df, coluna, crescente):
+    """Ordenação da tabela, refeita só quando os filtros ou a coluna mudam"""
+    chave = (chave_filtros, coluna, crescente)
+    em_cache = st.session_state.get("ordem_tabela")
+    if em_cache is None or em_cache[0] != chave:
+        em_cache = (chave, posicoes_ordenadas(df, coluna, crescente))
+        st.session_state["ordem_tabela"] = em_cache
+    return em_cache[1]
+
+@st.cache_resource
+def obter_cache_figuras():
+    """Cache de figuras do processo, compartilhado por todas as sessões"""
+    return CacheFiguras(LIMITE_CACHE_FIGURAS)
+
+# ---------- INSTRUMENTAÇÃO ----------
+@st.cache_resource
+def obter_registro_tempos():
+    """Tempos das etapas de todas as sessões do processo"""
+    return RegistroTempos(caminho_log=ARQUIVO_LOG_TEMPOS)
+
+def iniciar_medicao():
+    """Nova medição para esta execução completa do script"""
+    sessao = st.session_state.setdefault("id_sessao", uuid.uuid4().hex[:12])
+    execucao = st.session_state["execucoes"] = st.session_state.get("execucoes", 0) + 1
+    medicao = MedicaoExecucao(obter_registro_tempos(), sessao, execucao)
+    st.session_state["medicao_execucao"] = medicao
+    return medicao
+
+def medir(etapa):
+    """Bloco `with` que mede uma etapa (também dentro dos fragmentos)"""
+    return st.session_state["medicao_execucao"].etapa(etapa)
+
+def admin_ativo():
+    return bool(TOKEN_ADMIN) and st.query_params.get("admin") == TOKEN_ADMIN
+
+inicio_execucao = time.perf_counter()
+medicao = iniciar_medicao()
 
 # ---------- TÍTULO PRINCIPAL ----------
 st.title("🏥 Distribuição de Vagas - Concurso Secretaria da Saúde do Tocantins")
@@ -156,384 +219,480 @@ opcao_dados = st.sidebar.radio(
 )
 
 df = None
+banco = None
 fonte_dados = "ficticios"
-
-if opcao_dados == "📊 Usar dados fictícios (protótipo)":
-    df = gerar_dados_ficticios()
-    st.sidebar.success("✅ Usando dados fictícios")
-    fonte_dados = "ficticios"
-else:
-    st.sidebar.markdown("### 📤 Upload da planilha")
-    st.sidebar.markdown("""
-    **Formato esperado:**
-    - Colunas: `Município`, `Região de Saúde`, `Hospital`, `Cargo`, `Vagas`
-    - Arquivos: Excel (.xlsx) ou CSV (.csv)
-    """)
-    
-    arquivo = st.sidebar.file_uploader(
-        "Escolher arquivo",
-        type=['xlsx', 'csv'],
-        help="Faça upload de uma planilha com os dados do concurso"
-    )
-    
-    if arquivo is not None:
-        try:
-            # Tentar ler o arquivo
-            if arquivo.name.endswith('.csv'):
-                df_importado = pd.read_csv(arquivo)
+semente = SEMENTE_PADRAO
+escala = next(iter(ESCALAS_DADOS_FICTICIOS))
+
+with medir("dados"):
+    if opcao_dados == "📊 Usar dados fictícios (protótipo)":
+        with st.sidebar.expander("⚙️ Escala dos dados fictícios"):
+            escala = st.selectbox("Tamanho", list(ESCALAS_DADOS_FICTICIOS), key="ficticios_escala")
+            semente = int(st.number_input("Semente", min_value=0, value=SEMENTE_PADRAO, step=1, key="ficticios_semente"))
+        df = carregar_dados_ficticios(semente, escala)
+        st.sidebar.success("✅ Usando dados fictícios")
+        fonte_dados = "ficticios"
+    else:
+        st.sidebar.markdown("### 📤 Upload da planilha")
+        st.sidebar.markdown("""
+        **Formato esperado:**
+        - Colunas: `Município`, `Região de Saúde`, `Hospital`, `Cargo`, `Vagas`
+        - Arquivos: Excel (.xlsx) ou CSV (.csv)
+        """)
+        
+        arquivo = st.sidebar.file_uploader(
+            "Escolher arquivo",
+            type=['xlsx', 'csv'],
+            help="Faça upload de uma planilha com os dados do concurso"
+        )
+        
+        importacao = st.session_state.get("importacao")
+        if arquivo is None:
+            # Arquivo retirado: interrompe a leitura em andamento
+            if importacao is not None:
+                importacao.cancelar()
+                importacao = st.session_state["importacao"] = None
+        else:
+            conteudo = arquivo.getvalue()
+            chave_arquivo = calcular_hash_conteudo(conteudo)
+            if importacao is None or importacao.chave != chave_arquivo:
+                # Outro arquivo escolhido: a leitura do anterior é cancelada
+                if importacao is not None:
+                    importacao.cancelar()
+                importacao = st.session_state["importacao"] = iniciar_importacao(chave_arquivo, conteudo, arquivo.name)
+        
+        # Enquanto a planilha é lida, o painel segue com a última planilha importada
+        mostrar_anterior = False
+        if importacao is not None:
+            if not importacao.concluida:
+                with st.sidebar:
+                    acompanhar_importacao(importacao)
+                mostrar_anterior = True
+            elif importacao.cancelada:
+                st.sidebar.info("ℹ️ Importação cancelada.")
+                mostrar_anterior = True
+            elif importacao.erro is not None:
+                st.sidebar.error(f"❌ Erro ao ler arquivo: {str(importacao.erro)}")
             else:
-                df_importado = pd.read_excel(arquivo)
-            
-            # Validar estrutura
-            valido, mensagem = validar_dados_importados(df_importado)
+                df_importado, banco_importado, relatorio_erros, mensagem = importacao.resultado
+                valido = df_importado is not None or banco_importado is not None
+                
+                if valido:
+                    df, banco = df_importado, banco_importado
+                    registros = banco.registros if banco is not None else len(df)
+                    st.sidebar.success(f"✅ Arquivo carregado! {registros} registros encontrados.")
+                    st.sidebar.caption(f"ℹ️ {mensagem}")
+                    fonte_dados = "importado"
+                    chave_dados = importacao.chave
+                    st.session_state["ultima_importacao"] = (importacao.chave, importacao.nome_arquivo)
+                    
+                    # Uma planilha diferente da última vira a nova versão (retificação do edital)
+                    anterior, atual = st.session_state.get("versoes_planilha", (None, None))
+                    if atual is None or atual[0] != importacao.chave:
+                        st.session_state["versoes_planilha"] = (atual, (importacao.chave, importacao.nome_arquivo))
+                
+                # Relatório das linhas descartadas por erro
+                if relatorio_erros is not None:
+                    st.sidebar.warning(f"⚠️ {len(relatorio_erros)} problemas encontrados; as linhas com erro foram ignoradas.")
+                    with st.sidebar.expander("📋 Relatório de erros"):
+                        st.dataframe(relatorio_erros, use_container_width=True, hide_index=True)
+                        st.download_button(
+                            label="📥 Baixar relatório de erros (CSV)",
+                            data=relatorio_erros.to_csv(index=False).encode('utf-8'),
+                            file_name='erros_importacao.csv',
+                            mime='text/csv',
+                        )
+                
+                if not valido:
+                    st.sidebar.error(f"❌ Erro no formato: {mensagem}")
+                    
+                    # Mostrar exemplo do formato esperado
+                    st.sidebar.markdown("### 📋 Exemplo do formato esperado:")
+                    exemplo = pd.DataFrame({
+                        "Município": ["Palmas", "Araguaína"],
+                        "Região de Saúde": ["Capim Dourado", "Médio Norte Araguaia"],
+                        "Hospital": ["Hospital Geral de Palmas", "Hospital Regional de Araguaína"],
+                        "Cargo": ["Médico", "Enfermeiro"],
+                        "Vagas": [10, 15]
+                    })
+                    st.sidebar.dataframe(exemplo, use_container_width=True)
             
-            if valido:
-                df = df_importado
-                st.sidebar.success(f"✅ Arquivo carregado! {len(df)} registros encontrados.")
+        ultima = st.session_state.get("ultima_importacao")
+        if mostrar_anterior and ultima is not None:
+            df, banco = obter_importada(ultima[0])
+            if df is not None or banco is not None:
+                st.sidebar.info(f"ℹ️ Mostrando {ultima[1]} enquanto isso.")
                 fonte_dados = "importado"
+                chave_dados = ultima[0]
+        
+        # Se não carregou arquivo, volta para dados fictícios
+        if df is None and banco is None:
+            df = carregar_dados_ficticios(semente, escala)
+            if mostrar_anterior:
+                st.sidebar.info("ℹ️ Usando dados fictícios enquanto isso.")
             else:
-                st.sidebar.error(f"❌ Erro no formato: {mensagem}")
-                
-                # Mostrar exemplo do formato esperado
-                st.sidebar.markdown("### 📋 Exemplo do formato esperado:")
-                exemplo = pd.DataFrame({
-                    "Município": ["Palmas", "Araguaína"],
-                    "Região de Saúde": ["Capim Dourado", "Médio Norte Araguaia"],
-                    "Hospital": ["Hospital Geral de Palmas", "Hospital Regional de Araguaína"],
-                    "Cargo": ["Médico", "Enfermeiro"],
-                    "Vagas": [10, 15]
-                })
-                st.sidebar.dataframe(exemplo, use_container_width=True)
-                
-        except Exception as e:
-            st.sidebar.error(f"❌ Erro ao ler arquivo: {str(e)}")
-    
-    # Se não carregou arquivo, volta para dados fictícios
-    if df is None:
-        df = gerar_dados_ficticios()
-        st.sidebar.info("ℹ️ Nenhum arquivo carregado. Usando dados fictícios.")
-        fonte_dados = "ficticios"
+                st.sidebar.info("ℹ️ Nenhum arquivo carregado. Usando dados fictícios.")
+            fonte_dados = "ficticios"
+
+# Os dados fictícios são identificados pela semente e pela escala
+if fonte_dados == "ficticios":
+    chave_dados = f"ficticios:{semente}:{escala}"
+
+# Versão anterior da planilha, para a comparação (só com os dados em memória)
+versao_anterior = None
+if fonte_dados == "importado" and banco is None:
+    anterior, atual = st.session_state.get("versoes_planilha", (None, None))
+    if anterior is not None and atual[0] == chave_dados:
+        df_anterior, _ = obter_registro_dados().obter(anterior[0])
+        if df_anterior is not None:
+            versao_anterior = anterior
+            st.sidebar.caption(f"🔄 Comparando com a versão anterior: {anterior[1]}")
+
+# Uso de memória da representação compacta (ou de disco, no banco)
+if banco is not None:
+    st.sidebar.caption(f"💾 Dados em disco (SQLite): {formatar_bytes(banco.tamanho_em_bytes())}")
+elif "memoria_original" in df.attrs:
+    st.sidebar.caption(
+        f"💾 Memória dos dados: {formatar_bytes(df.attrs['memoria_original'])} → {formatar_bytes(tamanho_em_bytes(df))}"
+    )
 
 # ---------- FILTROS LATERAIS (baseados nos dados carregados) ----------
 st.sidebar.markdown("---")
 st.sidebar.header("🔍 Filtros")
 
-# Listas únicas para filtros
-regioes_unicas = sorted(df["Região de Saúde"].unique())
-municipios_unicos = sorted(df["Município"].unique())
-hospitais_unicos = sorted(df["Hospital"].unique())
-cargos_unicos = sorted(df["Cargo"].unique())
+with medir("filtros_laterais"):
+    # Opções dos filtros, pré-calculadas por conjunto de dados
+    hierarquia = obter_hierarquia_filtros(chave_dados, banco if banco is not None else df)
 
-# Filtro de Região
-regioes = ["Todas"] + regioes_unicas
-regiao_selecionada = st.sidebar.selectbox("Região de Saúde", regioes)
+    # Filtros de seleção múltipla: vazio = todos; valores de uma mesma dimensão
+    # se somam (OU) e dimensões diferentes se combinam (E)
 
-# Filtrar municípios baseado na região
-if regiao_selecionada != "Todas":
-    municipios_filtrados = sorted(df[df["Região de Saúde"] == regiao_selecionada]["Município"].unique())
-else:
-    municipios_filtrados = municipios_unicos
+    # Filtro de Região
+    regioes_selecionadas = st.sidebar.multiselect("Região de Saúde", hierarquia.regioes, placeholder="Todas")
 
-# Filtro de Município
-municipios_lista = ["Todos"] + municipios_filtrados
-municipio_selecionado = st.sidebar.selectbox("Município", municipios_lista)
+    # Filtro de Município (restrito às regiões escolhidas)
+    municipios_filtrados = hierarquia.municipios(regioes_selecionadas)
+    municipios_selecionados = st.sidebar.multiselect("Município", municipios_filtrados, placeholder="Todos")
 
-# Filtrar hospitais baseado no município
-if municipio_selecionado != "Todos":
-    hospitais_filtrados = sorted(df[df["Município"] == municipio_selecionado]["Hospital"].unique())
-elif regiao_selecionada != "Todas":
-    hospitais_filtrados = sorted(df[df["Região de Saúde"] == regiao_selecionada]["Hospital"].unique())
-else:
-    hospitais_filtrados = hospitais_unicos
+    # Filtro de Hospital (restrito aos municípios ou regiões escolhidos)
+    hospitais_filtrados = hierarquia.hospitais(regioes_selecionadas, municipios_selecionados)
+    hospitais_selecionados = st.sidebar.multiselect("Hospital", hospitais_filtrados, placeholder="Todos")
 
-# Filtro de Hospital
-hospitais_lista = ["Todos"] + hospitais_filtrados
-hospital_selecionado = st.sidebar.selectbox("Hospital", hospitais_lista)
-
-# Filtro de Cargo
-cargos_lista = ["Todos"] + cargos_unicos
-cargo_selecionado = st.sidebar.selectbox("Cargo", cargos_lista)
+    # Filtro de Cargo
+    cargos_selecionados = st.sidebar.multiselect("Cargo", hierarquia.cargos, placeholder="Todos")
 
 # ---------- APLICAR FILTROS ----------
-df_filtrado = df.copy()
-if regiao_selecionada != "Todas":
-    df_filtrado = df_filtrado[df_filtrado["Região de Saúde"] == regiao_selecionada]
-if municipio_selecionado != "Todos":
-    df_filtrado = df_filtrado[df_filtrado["Município"] == municipio_selecionado]
-if hospital_selecionado != "Todos":
-    df_filtrado = df_filtrado[df_filtrado["Hospital"] == hospital_selecionado]
-if cargo_selecionado != "Todos":
-    df_filtrado = df_filtrado[df_filtrado["Cargo"] == cargo_selecionado]
+filtros = {}
+if regioes_selecionadas:
+    filtros["Região de Saúde"] = regioes_selecionadas
+if municipios_selecionados:
+    filtros["Município"] = municipios_selecionados
+if hospitais_selecionados:
+    filtros["Hospital"] = hospitais_selecionados
+if cargos_selecionados:
+    filtros["Cargo"] = cargos_selecionados
+
+with medir("filtragem"):
+    if banco is not None:
+        # Consulta ao banco: as linhas só são lidas por página ou na exportação
+        df_filtrado = banco.filtrar(filtros)
+    else:
+        indice_filtros = obter_indice_filtros(chave_dados, df)
+        df_filtrado = indice_filtros.aplicar(df, filtros)
+
+# Agregações compartilhadas por todas as métricas e gráficos
+chave_filtros = (chave_dados,) + tuple((col, tuple(sorted(valores))) for col, valores in filtros.items())
+diferenca = None
+with medir("cubo"):
+    if versao_anterior is not None:
+        diferenca = obter_diferenca_versoes(versao_anterior[0], chave_dados, df_anterior, df)
+    cubo = obter_cubo(chave_filtros, df_filtrado, diferenca, versao_anterior[0] if versao_anterior else None)
 
 # ---------- MÉTRICAS RESUMO ----------
 st.markdown(f"**Fonte:** {'Dados fictícios' if fonte_dados == 'ficticios' else 'Planilha importada'}")
 
-col1, col2, col3, col4 = st.columns(4)
-with col1:
-    st.metric("Total de Vagas", df_filtrado["Vagas"].sum())
-with col2:
-    st.metric("Hospitais", df_filtrado["Hospital"].nunique())
-with col3:
-    st.metric("Municípios", df_filtrado["Município"].nunique())
-with col4:
-    st.metric("Cargos", df_filtrado["Cargo"].nunique())
+with medir("metricas"):
+    resumo = resumo_estatistico(cubo)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Total de Vagas", resumo["total_vagas"])
+    with col2:
+        st.metric("Hospitais", resumo["hospitais"])
+    with col3:
+        st.metric("Municípios", resumo["municipios"])
+    with col4:
+        st.metric("Cargos", resumo["cargos"])
 
 # ---------- TABELA DE DADOS ----------
 st.subheader("📋 Detalhamento das Vagas")
-st.dataframe(df_filtrado, use_container_width=True, height=400)
+
+# Só a página atual é enviada ao navegador; paginar e ordenar reexecuta apenas o fragmento
+@st.fragment
+def exibir_tabela(df_filtrado, cubo, chave_filtros):
+    with medir("tabela"):
+        total_linhas = len(df_filtrado)
+        
+        col_modo, col_tamanho = st.columns([3, 1])
+        with col_modo:
+            modo = st.radio(
+                "Exibir:",
+                ["Linhas", "Agregada"],
+                index=1 if total_linhas > LIMITE_LINHAS_DETALHADAS else 0,
+                horizontal=True,
+                key="tabela_modo"
+            )
+        with col_tamanho:
+            tamanho_pagina = st.selectbox("Linhas por página", TAMANHOS_PAGINA, index=1, key="tabela_tamanho_pagina")
+        
+        if modo == "Agregada":
+            agrupar = st.multiselect(
+                "Agrupar por:",
+                DIMENSOES,
+                default=["Região de Saúde", "Município"],
+                key="tabela_agrupar"
+            )
+            # Soma de vagas já calculada pelo cubo, do maior para o menor
+            dados = cubo.soma_por(*agrupar) if agrupar else pd.DataFrame({"Vagas": [cubo.total_vagas()]})
+            ordem = None
+        else:
+            col_ordem, col_sentido = st.columns([3, 1])
+            with col_ordem:
+                coluna_ordem = st.selectbox("Ordenar por", ["(ordem original)"] + list(df_filtrado.columns), key="tabela_ordem")
+            with col_sentido:
+                crescente = st.radio("Sentido", ["Crescente", "Decrescente"], horizontal=True, key="tabela_sentido") == "Crescente"
+            
+            dados = df_filtrado
+            ordem = None
+            if coluna_ordem != "(ordem original)" and not isinstance(df_filtrado, ConsultaBanco):
+                ordem = obter_ordem_tabela(chave_filtros, df_filtrado, coluna_ordem, crescente)
+        
+        total_paginas = max(1, -(-len(dados) // tamanho_pagina))
+        pagina = st.number_input(f"Página (de {total_paginas})", min_value=1, max_value=total_paginas, value=1, step=1)
+        inicio = (pagina - 1) * tamanho_pagina
+        fim = min(inicio + tamanho_pagina, len(dados))
+        
+        if isinstance(dados, ConsultaBanco):
+            # Só a página pedida é lida do banco, já ordenada
+            pagina_dados = dados.pagina(inicio, fim, None if coluna_ordem == "(ordem original)" else coluna_ordem, crescente)
+        elif ordem is None:
+            pagina_dados = dados.iloc[inicio:fim]
+        else:
+            pagina_dados = dados.iloc[ordem[inicio:fim]]
+        
+        st.dataframe(pagina_dados, use_container_width=True, height=400)
+        st.caption(f"Linhas {inicio + 1 if fim else 0}–{fim} de {len(dados)}")
+
+exibir_tabela(df_filtrado, cubo, chave_filtros)
 
 # ---------- GRÁFICOS ----------
 st.subheader("📊 Visualizações")
 
-# Abas para organizar os diferentes tipos de gráfico
-aba1, aba2, aba3, aba4, aba5 = st.tabs([
-    "📊 Barras", 
-    "🔥 Mapa de Calor", 
-    "🥧 Pizza/Rosca", 
-    "📚 Barras Empilhadas", 
-    "🌳 Treemap"
-])
-
-with aba1:
-    # GRÁFICO 1: BARRAS
-    st.markdown("### Total de Vagas por Categoria")
-    tipo_grafico = st.radio("Agrupar por:", ("Município", "Cargo", "Região de Saúde", "Hospital"), horizontal=True, key="bar_radio")
-    
-    if tipo_grafico == "Município":
-        df_group = df_filtrado.groupby("Município")["Vagas"].sum().reset_index()
-        x_label = "Município"
-        titulo = "Total de Vagas por Município"
-    elif tipo_grafico == "Cargo":
-        df_group = df_filtrado.groupby("Cargo")["Vagas"].sum().reset_index()
-        x_label = "Cargo"
-        titulo = "Total de Vagas por Cargo"
-    elif tipo_grafico == "Região de Saúde":
-        df_group = df_filtrado.groupby("Região de Saúde")["Vagas"].sum().reset_index()
-        x_label = "Região de Saúde"
-        titulo = "Total de Vagas por Região de Saúde"
-    else:
-        df_group = df_filtrado.groupby("Hospital")["Vagas"].sum().reset_index()
-        x_label = "Hospital"
-        titulo = "Total de Vagas por Hospital"
-    
-    df_group = df_group.sort_values("Vagas", ascending=False)
-    
-    fig = px.bar(
-        df_group, 
-        x=x_label, 
-        y="Vagas",
-        title=titulo,
-        text="Vagas",
-        color_discrete_sequence=["#1f77b4"]
+# Fragmento: trocar de gráfico ou de agrupamento reexecuta só esta parte,
+# reaproveitando o cubo da última execução completa
+@st.fragment
+def exibir_visualizacoes(cubo, chave_filtros):
+    # Só o gráfico escolhido é montado (as abas montariam os cinco a cada execução)
+    # e figuras já vistas com os mesmos dados e filtros vêm do cache
+    cache_figuras = obter_cache_figuras()
+
+    visualizacao = st.radio(
+        "Visualização:",
+        ["📊 Barras", "🔥 Mapa de Calor", "🥧 Pizza/Rosca", "📚 Barras Empilhadas", "🌳 Treemap"],
+        horizontal=True,
+        key="visualizacao"
     )
-    
-    fig.update_traces(
-        textposition="outside",
-        textfont_size=11,
-        cliponaxis=False,
-        marker_line_width=0,
-        opacity=0.8
-    )
-    
-    altura = 500 + max(0, (len(df_group) - 10) * 15)
-    fig.update_layout(
-        xaxis_title="",
-        yaxis_title="Número de Vagas",
-        xaxis_tickangle=-45 if len(df_group) > 5 else 0,
-        height=altura,
-        margin=dict(l=80, r=80, t=100, b=150),
-        showlegend=False,
-        yaxis=dict(range=[0, df_group["Vagas"].max() * 1.15])
-    )
-    
-    st.plotly_chart(fig, use_container_width=True)
-    st.caption(f"Total de vagas por {tipo_grafico.lower()}")
-    st.dataframe(df_group, use_container_width=True, height=200)
 
-with aba2:
-    # GRÁFICO 2: MAPA DE CALOR
-    st.markdown("### 🔥 Mapa de Calor: Vagas por Região de Saúde e Cargo")
-    
-    # Criar tabela pivô para o heatmap
-    heatmap_data = df_filtrado.pivot_table(
-        values='Vagas', 
-        index='Região de Saúde', 
-        columns='Cargo', 
-        aggfunc='sum', 
-        fill_value=0
-    )
-    
-    # Selecionar top cargos para não poluir visualmente
-    top_cargos = df_filtrado.groupby('Cargo')['Vagas'].sum().nlargest(10).index.tolist()
-    heatmap_data_top = heatmap_data[top_cargos] if not heatmap_data.empty else heatmap_data
-    
-    if not heatmap_data_top.empty and heatmap_data_top.shape[0] > 0:
-        fig_heatmap = px.imshow(
-            heatmap_data_top,
-            text_auto=True,
-            aspect="auto",
-            color_continuous_scale='Blues',
-            title="Distribuição de Vagas por Região de Saúde e Cargo (Top 10 Cargos)",
-            labels=dict(x="Cargo", y="Região de Saúde", color="Vagas")
-        )
-        fig_heatmap.update_layout(
-            height=500,
-            xaxis_tickangle=-45,
-            margin=dict(l=150, r=50, t=100, b=150)
-        )
-        st.plotly_chart(fig_heatmap, use_container_width=True)
-        st.caption("Quanto mais escuro o azul, maior o número de vagas naquela combinação Região x Cargo")
-    else:
-        st.info("Selecione menos filtros para visualizar o mapa de calor")
+    # Tempo por visualização (a figura pode vir do cache)
+    with medir(f"grafico: {visualizacao.split(' ', 1)[1]}"):
+        if visualizacao == "📊 Barras":
+            # GRÁFICO 1: BARRAS
+            st.markdown("### Total de Vagas por Categoria")
+            tipo_grafico = st.radio("Agrupar por:", ("Município", "Cargo", "Região de Saúde", "Hospital"), horizontal=True, key="bar_radio")
+
+            fig = cache_figuras.obter(chave_filtros + ("barras", tipo_grafico), lambda: figura_barras(cubo, tipo_grafico))
+            st.plotly_chart(fig, use_container_width=True)
+            st.caption(f"Total de vagas por {tipo_grafico.lower()}")
+            st.dataframe(cubo.soma_por(tipo_grafico), use_container_width=True, height=200)
+
+        elif visualizacao == "🔥 Mapa de Calor":
+            # GRÁFICO 2: MAPA DE CALOR
+            st.markdown("### 🔥 Mapa de Calor: Vagas por Região de Saúde e Cargo")
+
+            fig_heatmap = cache_figuras.obter(chave_filtros + ("mapa_calor",), lambda: figura_mapa_calor(cubo))
+            if fig_heatmap is not None:
+                st.plotly_chart(fig_heatmap, use_container_width=True)
+                st.caption("Quanto mais escuro o azul, maior o número de vagas naquela combinação Região x Cargo")
+            else:
+                st.info("Selecione menos filtros para visualizar o mapa de calor")
+
+        elif visualizacao == "🥧 Pizza/Rosca":
+            # GRÁFICO 3: PIZZA/ROSCA
+            st.markdown("### 🥧 Distribuição Percentual de Vagas")
+
+            col_pizza1, col_pizza2 = st.columns(2)
+
+            with col_pizza1:
+                # Pizza por Região
+                fig_pizza_regiao = cache_figuras.obter(chave_filtros + ("pizza_regiao",), lambda: figura_pizza_regiao(cubo))
+                if fig_pizza_regiao is not None:
+                    st.plotly_chart(fig_pizza_regiao, use_container_width=True)
+                else:
+                    st.info("Sem dados para região")
+
+            with col_pizza2:
+                # Pizza por Cargo (top 8 para não poluir)
+                fig_pizza_cargo = cache_figuras.obter(chave_filtros + ("pizza_cargo",), lambda: figura_pizza_cargo(cubo))
+                if fig_pizza_cargo is not None:
+                    st.plotly_chart(fig_pizza_cargo, use_container_width=True)
+                else:
+                    st.info("Sem dados para cargo")
+
+        elif visualizacao == "📚 Barras Empilhadas":
+            # GRÁFICO 4: BARRAS EMPILHADAS
+            st.markdown("### 📚 Composição de Cargos por Município")
+
+            fig_stack = cache_figuras.obter(chave_filtros + ("barras_empilhadas",), lambda: figura_barras_empilhadas(cubo))
+            if fig_stack is not None:
+                st.plotly_chart(fig_stack, use_container_width=True)
+                st.caption("Cada barra mostra a distribuição de cargos dentro do município")
+            else:
+                st.info("Selecione menos filtros ou mais municípios para visualizar")
 
-with aba3:
-    # GRÁFICO 3: PIZZA/ROSCA
-    st.markdown("### 🥧 Distribuição Percentual de Vagas")
-    
-    col_pizza1, col_pizza2 = st.columns(2)
-    
-    with col_pizza1:
-        # Pizza por Região
-        df_regiao = df_filtrado.groupby("Região de Saúde")["Vagas"].sum().reset_index()
-        df_regiao = df_regiao.sort_values("Vagas", ascending=False)
-        
-        if not df_regiao.empty:
-            fig_pizza_regiao = px.pie(
-                df_regiao,
-                values='Vagas',
-                names='Região de Saúde',
-                title='Distribuição por Região de Saúde',
-                hole=0.3,
-                color_discrete_sequence=px.colors.qualitative.Set3
-            )
-            fig_pizza_regiao.update_traces(textposition='inside', textinfo='percent+label')
-            fig_pizza_regiao.update_layout(height=400)
-            st.plotly_chart(fig_pizza_regiao, use_container_width=True)
         else:
-            st.info("Sem dados para região")
-    
-    with col_pizza2:
-        # Pizza por Cargo (top 8 para não poluir)
-        df_cargo = df_filtrado.groupby("Cargo")["Vagas"].sum().reset_index()
-        df_cargo = df_cargo.sort_values("Vagas", ascending=False).head(8)
-        outros = df_filtrado.groupby("Cargo")["Vagas"].sum().sum() - df_cargo["Vagas"].sum()
+            # GRÁFICO 5: TREEMAP
+            st.markdown("### 🌳 Treemap - Hierarquia Região > Município > Vagas")
+
+            fig_treemap = cache_figuras.obter(chave_filtros + ("treemap",), lambda: figura_treemap(cubo))
+            if fig_treemap is not None:
+                st.plotly_chart(fig_treemap, use_container_width=True)
+                st.caption("Área de cada retângulo proporcional ao número de vagas. Clicar para navegar na hierarquia.")
+            else:
+                st.info("Sem dados suficientes para treemap")
+
+    st.caption(f"🖼️ Cache de gráficos: {cache_figuras.acertos} acertos, {cache_figuras.falhas} falhas")
+
+exibir_visualizacoes(cubo, chave_filtros)
+
+# ---------- RESUMO ESTATÍSTICO ----------
+with medir("estatisticas"):
+    with st.expander("📈 Análise Estatística"):
+        col_est1, col_est2 = st.columns(2)
         
-        if outros > 0:
-            df_cargo = pd.concat([df_cargo, pd.DataFrame([{"Cargo": "Outros", "Vagas": outros}])])
+        with col_est1:
+            st.markdown("#### Municípios com mais vagas")
+            st.dataframe(resumo["top_municipios"], use_container_width=True)
+            
+            st.markdown("#### Cargos com mais vagas")
+            st.dataframe(resumo["top_cargos"], use_container_width=True)
         
-        if not df_cargo.empty:
-            fig_pizza_cargo = px.pie(
-                df_cargo,
-                values='Vagas',
-                names='Cargo',
-                title='Distribuição por Cargo (Top 8 + Outros)',
-                hole=0.3,
-                color_discrete_sequence=px.colors.qualitative.Pastel
-            )
-            fig_pizza_cargo.update_traces(textposition='inside', textinfo='percent+label', textfont_size=10)
-            fig_pizza_cargo.update_layout(height=400)
-            st.plotly_chart(fig_pizza_cargo, use_container_width=True)
+        with col_est2:
+            st.markdown("#### Estatísticas Gerais")
+            st.metric("Média de vagas por município", f"{resumo['media']:.1f}")
+            st.metric("Mediana de vagas por município", f"{resumo['mediana']:.1f}")
+            st.metric("Total de Hospitais", resumo["hospitais"])
+            st.metric("Total de Cargos distintos", resumo["cargos"])
+            
+            st.markdown("#### Amplitude de vagas")
+            st.metric("Mínimo", resumo["minimo"])
+            st.metric("Máximo", resumo["maximo"])
+
+# ---------- MUDANÇAS ENTRE VERSÕES ----------
+# Só aparece quando a planilha atual substituiu outra nesta sessão
+@st.fragment
+def exibir_diferencas(diferenca, filtros, chave_versoes):
+    with medir("versoes"):
+        st.subheader("🔄 Mudanças em relação à versão anterior")
+        
+        resumo = diferenca.resumo(filtros)
+        col_inc, col_rem, col_alt, col_saldo = st.columns(4)
+        with col_inc:
+            st.metric("Chaves incluídas", resumo["Incluída"])
+        with col_rem:
+            st.metric("Chaves removidas", resumo["Removida"])
+        with col_alt:
+            st.metric("Chaves alteradas", resumo["Alterada"])
+        with col_saldo:
+            st.metric("Saldo de vagas", f"{resumo['saldo']:+d}")
+        st.caption("Cada chave é uma combinação Município + Hospital + Cargo.")
+        
+        dimensao = st.radio("Comparar por:", ("Região de Saúde", "Município", "Cargo"), horizontal=True, key="diferenca_dimensao")
+        por_dimensao = diferenca.por(dimensao, filtros)
+        fig_dif = obter_cache_figuras().obter(chave_versoes + ("diferencas", dimensao), lambda: figura_diferencas(por_dimensao, dimensao))
+        if fig_dif is not None:
+            st.plotly_chart(fig_dif, use_container_width=True)
+            st.dataframe(por_dimensao, use_container_width=True, height=200, hide_index=True)
         else:
-            st.info("Sem dados para cargo")
+            st.info("Nenhuma mudança de vagas nos filtros selecionados")
+        
+        alteracoes = diferenca.alteracoes(filtros)
+        if not alteracoes.empty:
+            with st.expander(f"📋 Chaves alteradas ({len(alteracoes)})"):
+                st.dataframe(alteracoes.head(LIMITE_LINHAS_ALTERACOES), use_container_width=True, hide_index=True)
+                if len(alteracoes) > LIMITE_LINHAS_ALTERACOES:
+                    st.caption(f"Mostrando as {LIMITE_LINHAS_ALTERACOES} maiores variações.")
 
-with aba4:
-    # GRÁFICO 4: BARRAS EMPILHADAS
-    st.markdown("### 📚 Composição de Cargos por Município")
+if diferenca is not None:
+    exibir_diferencas(diferenca, filtros, (versao_anterior[0],) + chave_filtros)
+
+# ---------- DOWNLOAD DOS DADOS FILTRADOS ----------
+# O arquivo só é gerado quando pedido, gravado em blocos num arquivo temporário
+@st.fragment
+def exibir_exportacao(df_filtrado, chave_filtros):
+    formato = st.selectbox("Formato do arquivo", list(FORMATOS_EXPORTACAO), key="exportacao_formato")
+    extensao, mime = FORMATOS_EXPORTACAO[formato]
     
-    # Preparar dados para barras empilhadas
-    df_stack = df_filtrado.groupby(["Município", "Cargo"])["Vagas"].sum().reset_index()
+    # Descarta um arquivo gerado para outros filtros ou outro formato
+    exportado = st.session_state.get("exportacao")
+    if exportado is not None and exportado[0] != (chave_filtros, formato):
+        exportado[1].close()
+        exportado = st.session_state["exportacao"] = None
     
-    # Selecionar top municípios por total de vagas
-    top_municipios = df_filtrado.groupby("Município")["Vagas"].sum().nlargest(8).index.tolist()
-    df_stack_top = df_stack[df_stack["Município"].isin(top_municipios)]
+    if exportado is None:
+        if st.button(f"📦 Gerar arquivo ({formato})"):
+            arquivo = tempfile.TemporaryFile()
+            try:
+                with st.spinner("Gerando arquivo..."), medir("exportacao"):
+                    exportar_dados(df_filtrado, formato, arquivo)
+                    arquivo.flush()
+            except (ImportError, ValueError) as e:
+                arquivo.close()
+                st.error(f"❌ {e}")
+            else:
+                exportado = st.session_state["exportacao"] = ((chave_filtros, formato), arquivo)
     
-    if not df_stack_top.empty:
-        # Criar gráfico de barras empilhadas
-        fig_stack = px.bar(
-            df_stack_top,
-            x="Município",
-            y="Vagas",
-            color="Cargo",
-            title="Composição de Cargos nos Principais Municípios",
-            text_auto=True,
-            barmode="stack",
-            color_discrete_sequence=px.colors.qualitative.Bold
-        )
-        fig_stack.update_layout(
-            height=500,
-            xaxis_tickangle=-45,
-            yaxis_title="Número de Vagas",
-            margin=dict(l=50, r=50, t=100, b=150),
-            legend=dict(orientation="h", yanchor="bottom", y=-0.5, xanchor="center", x=0.5)
+    if exportado is not None:
+        # O download_button aceita o arquivo bruto (sem buffer) do temporário
+        arquivo_bruto = exportado[1].raw
+        arquivo_bruto.seek(0)
+        st.download_button(
+            label=f"📥 Download dos dados filtrados ({formato})",
+            data=arquivo_bruto,
+            file_name=f'vagas_saude_to_filtrado.{extensao}',
+            mime=mime,
         )
-        fig_stack.update_traces(textfont_size=10, textposition="inside")
-        st.plotly_chart(fig_stack, use_container_width=True)
-        st.caption("Cada barra mostra a distribuição de cargos dentro do município")
-    else:
-        st.info("Selecione menos filtros ou mais municípios para visualizar")
 
-with aba5:
-    # GRÁFICO 5: TREEMAP
-    st.markdown("### 🌳 Treemap - Hierarquia Região > Município > Vagas")
-    
-    # Preparar dados hierárquicos
-    df_treemap = df_filtrado.groupby(["Região de Saúde", "Município"])["Vagas"].sum().reset_index()
-    
-    if not df_treemap.empty:
-        fig_treemap = px.treemap(
-            df_treemap,
-            path=["Região de Saúde", "Município"],
-            values="Vagas",
-            title="Distribuição Hierárquica de Vagas: Região de Saúde > Município",
-            color="Vagas",
-            color_continuous_scale="Blues",
-            hover_data={"Vagas": True}
-        )
-        fig_treemap.update_layout(height=600, margin=dict(l=25, r=25, t=50, b=25))
-        fig_treemap.update_traces(
-            textinfo="label+value+percent parent",
-            textfont_size=12
-        )
-        st.plotly_chart(fig_treemap, use_container_width=True)
-        st.caption("Área de cada retângulo proporcional ao número de vagas. Clicar para navegar na hierarquia.")
-    else:
-        st.info("Sem dados suficientes para treemap")
+exibir_exportacao(df_filtrado, chave_filtros)
 
-# ---------- RESUMO ESTATÍSTICO ----------
-with st.expander("📈 Análise Estatística"):
-    col_est1, col_est2 = st.columns(2)
-    
-    with col_est1:
-        st.markdown("#### Municípios com mais vagas")
-        top_muni = df_filtrado.groupby("Município")["Vagas"].sum().nlargest(5).reset_index()
-        st.dataframe(top_muni, use_container_width=True)
-        
-        st.markdown("#### Cargos com mais vagas")
-        top_cargos = df_filtrado.groupby("Cargo")["Vagas"].sum().nlargest(5).reset_index()
-        st.dataframe(top_cargos, use_container_width=True)
-    
-    with col_est2:
-        st.markdown("#### Estatísticas Gerais")
-        media_muni = df_filtrado.groupby("Município")["Vagas"].sum().mean()
-        mediana_muni = df_filtrado.groupby("Município")["Vagas"].sum().median()
+# ---------- PAINEL DE DESEMPENHO (ADMIN) ----------
+medicao.registrar("execucao completa", time.perf_counter() - inicio_execucao)
+
+if admin_ativo():
+    with st.sidebar.expander("⏱️ Desempenho"):
+        st.markdown("#### Esta execução")
+        st.dataframe(medicao.tabela(), use_container_width=True, hide_index=True)
+        st.caption("Etapas dos fragmentos (tabela, gráficos, exportação) são atualizadas na próxima execução completa.")
         
-        st.metric("Média de vagas por município", f"{media_muni:.1f}")
-        st.metric("Mediana de vagas por município", f"{mediana_muni:.1f}")
-        st.metric("Total de Hospitais", df_filtrado["Hospital"].nunique())
-        st.metric("Total de Cargos distintos", df_filtrado["Cargo"].nunique())
+        st.markdown("#### Todas as sessões")
+        st.dataframe(obter_registro_tempos().percentis(), use_container_width=True, hide_index=True)
         
-        st.markdown("#### Amplitude de vagas")
-        st.metric("Mínimo", df_filtrado["Vagas"].min())
-        st.metric("Máximo", df_filtrado["Vagas"].max())
-
-# ---------- DOWNLOAD DOS DADOS FILTRADOS ----------
-csv = df_filtrado.to_csv(index=False).encode('utf-8')
-st.download_button(
-    label="📥 Download dos dados filtrados (CSV)",
-    data=csv,
-    file_name='vagas_saude_to_filtrado.csv',
-    mime='text/csv',
-)
+        registro = obter_registro_dados().estatisticas()
+        st.caption(
+            f"🗄️ Conjuntos de dados: {registro['conjuntos']} em memória, "
+            f"{formatar_bytes(registro['bytes_usados'])} de {formatar_bytes(registro['limite_bytes'])}; "
+            f"{registro['acertos']} acertos, {registro['falhas']} falhas, {registro['descartes']} descartes"
+        )
+        if ARQUIVO_LOG_TEMPOS:
+            st.caption(f"📝 Tempos gravados em `{ARQUIVO_LOG_TEMPOS}`")
 
 # ---------- RODAPÉ ----------
 st.markdown("---")
@@ -0,0 +1,410 @@
+"""Armazenamento opcional das planilhas em SQLite, com filtros e agregações feitos no banco.
+
+Os dados ficam em disco, com índices nas quatro dimensões; o painel só recebe
+os resultados já agregados e a página atual da tabela. Assim é possível usar
+planilhas maiores que a memória do servidor.
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from dados import (
+    COLUNAS_ESPERADAS, DIMENSOES, TAMANHO_BLOCO_EXPORTACAO, TAMANHO_BLOCO_LEITURA,
+    LeituraPlanilha, TravasPorChave, nome_outros,
+)
+
+# Tipos das colunas nos DataFrames devolvidos pelas consultas
+TIPOS_COLUNAS = {coluna: "string" for coluna in DIMENSOES} | {"Vagas": "int64"}
+
+# ---------- SQL ----------
+def coluna_sql(nome):
+    """Nome de coluna entre aspas (os nomes têm espaços e acentos)"""
+    return '"' + nome.replace('"', '""') + '"'
+
+def marcadores(valores):
+    return ", ".join("?" * len(valores))
+
+def condicao_filtros(filtros, extras=()):
+    """Cláusula WHERE e parâmetros para os filtros {coluna: [valores]}.
+
+    `extras` são pares (condição, parâmetros) somados aos filtros com AND.
+    """
+    partes, parametros = [], []
+    for coluna, valores in filtros.items():
+        partes.append(f"{coluna_sql(coluna)} IN ({marcadores(valores)})")
+        parametros.extend(valores)
+    for condicao, parametros_extras in extras:
+        partes.append(condicao)
+        parametros.extend(parametros_extras)
+    return (" WHERE " + " AND ".join(partes) if partes else ""), parametros
+
+
+# ---------- IMPORTAÇÃO ----------
+def importar_para_banco(caminho, conteudo, nome_arquivo, progresso=None, tamanho_bloco=TAMANHO_BLOCO_LEITURA,
+                        cancelamento=None):
+    """Lê e valida a planilha em blocos, gravando direto num arquivo SQLite.
+
+    Segue as mesmas regras de `importar_planilha` (linhas com erro descartadas,
+    repetições somadas, progresso e cancelamento), mas sem montar o DataFrame
+    em memória. O arquivo só aparece em `caminho` se houver ao menos uma linha
+    válida. Retorna (relatorio_erros, mensagem).
+    """
+    caminho = Path(caminho)
+    # Nome único na mesma pasta: outra importação nunca mexe neste arquivo
+    descritor, temporario = tempfile.mkstemp(suffix=".tmp", prefix=f"{caminho.stem}-", dir=caminho.parent)
+    os.close(descritor)
+    temporario = Path(temporario)
+
+    definicao = ", ".join(
+        f"{coluna_sql(c)} {'INTEGER' if c == 'Vagas' else 'TEXT'}" for c in COLUNAS_ESPERADAS
+    )
+    leitura = LeituraPlanilha(conteudo, nome_arquivo, progresso, tamanho_bloco, cancelamento)
+
+    conexao = sqlite3.connect(temporario)
+    concluido = False
+    try:
+        # Linhas brutas numa tabela temporária; a definitiva já sai com as repetições somadas
+        conexao.execute(f"CREATE TEMP TABLE brutas ({definicao})")
+        inserir = f"INSERT INTO brutas VALUES ({marcadores(COLUNAS_ESPERADAS)})"
+        for validas in leitura.blocos_validos():
+            conexao.executemany(inserir, zip(*(validas[c].tolist() for c in COLUNAS_ESPERADAS)))
+        if leitura.erro is not None:
+            return None, leitura.erro
+
+        relatorio_erros = leitura.relatorio_erros()
+        dimensoes = ", ".join(coluna_sql(c) for c in DIMENSOES)
+        sem_vagas = ", ".join(coluna_sql(c) for c in COLUNAS_ESPERADAS if c != "Vagas")
+        conexao.execute(f"CREATE TABLE vagas ({definicao})")
+        conexao.execute(
+            f'INSERT INTO vagas SELECT {sem_vagas}, SUM("Vagas") FROM brutas '
+            f"GROUP BY {dimensoes} ORDER BY MIN(rowid)"
+        )
+        conexao.execute("DROP TABLE brutas")
+
+        registros = conexao.execute("SELECT COUNT(*) FROM vagas").fetchone()[0]
+        if registros == 0:
+            return relatorio_erros, "Nenhuma linha válida encontrada"
+
+        for i, coluna in enumerate(DIMENSOES):
+            conexao.execute(f"CREATE INDEX indice_{i} ON vagas ({coluna_sql(coluna)})")
+
+        mensagem = leitura.mensagem(registros)
+        conexao.execute("CREATE TABLE metadados (chave TEXT PRIMARY KEY, valor TEXT)")
+        conexao.execute("INSERT INTO metadados VALUES ('mensagem', ?)", (mensagem,))
+        if relatorio_erros is not None:
+            relatorio_erros.astype({"Valor": str}).to_sql("erros_importacao", conexao, index=False)
+        conexao.commit()
+        concluido = True
+    finally:
+        conexao.close()
+        if not concluido:
+            temporario.unlink(missing_ok=True)
+
+    os.replace(temporario, caminho)
+    return relatorio_erros, mensagem
+
+
+# ---------- BANCO DE UMA PLANILHA ----------
+class BancoVagas:
+    """Planilha importada num arquivo SQLite, consultada só para leitura.
+
+    Cada consulta abre a própria conexão, então o mesmo banco pode ser usado
+    por várias sessões ao mesmo tempo.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+        self.registros = self.valor("SELECT COUNT(*) FROM vagas")
+
+    def _conectar(self):
+        return sqlite3.connect(f"file:{self.caminho}?mode=ro", uri=True)
+
+    def consultar(self, sql, parametros=()):
+        conexao = self._conectar()
+        try:
+            return pd.read_sql_query(sql, conexao, params=list(parametros))
+        finally:
+            conexao.close()
+
+    def valor(self, sql, parametros=()):
+        conexao = self._conectar()
+        try:
+            return conexao.execute(sql, list(parametros)).fetchone()[0]
+        finally:
+            conexao.close()
+
+    def tamanho_em_bytes(self):
+        return self.caminho.stat().st_size
+
+    def mensagem(self):
+        return self.valor("SELECT valor FROM metadados WHERE chave = 'mensagem'")
+
+    def relatorio_erros(self):
+        """Linhas descartadas na importação, ou None se não houve erro"""
+        existe = self.valor("SELECT COUNT(*) FROM sqlite_master WHERE name = 'erros_importacao'")
+        return self.consultar("SELECT * FROM erros_importacao") if existe else None
+
+    def hierarquia(self):
+        return HierarquiaBanco(self)
+
+    def filtrar(self, filtros):
+        return ConsultaBanco(self, filtros)
+
+
+# ---------- HIERARQUIA DOS FILTROS ----------
+class HierarquiaBanco:
+    """Opções dos filtros em cascata, consultadas no banco (mesma interface de HierarquiaFiltros)"""
+
+    def __init__(self, banco):
+        self.banco = banco
+        self.regioes = self._distintos("Região de Saúde", {})
+        self.todos_municipios = self._distintos("Município", {})
+        self.todos_hospitais = self._distintos("Hospital", {})
+        self.cargos = self._distintos("Cargo", {})
+
+    def _distintos(self, coluna, filtros):
+        onde, parametros = condicao_filtros(filtros)
+        sql = f"SELECT DISTINCT {coluna_sql(coluna)} FROM vagas{onde} ORDER BY 1"
+        return self.banco.consultar(sql, parametros).iloc[:, 0].tolist()
+
+    def municipios(self, regioes):
+        """Municípios das regiões selecionadas (todos, se nenhuma)"""
+        if not regioes:
+            return self.todos_municipios
+        return self._distintos("Município", {"Região de Saúde": regioes})
+
+    def hospitais(self, regioes, municipios):
+        """Hospitais dos municípios selecionados, ou das regiões se não houver município"""
+        if municipios:
+            return self._distintos("Hospital", {"Município": municipios})
+        if regioes:
+            return self._distintos("Hospital", {"Região de Saúde": regioes})
+        return self.todos_hospitais
+
+
+# ---------- LINHAS FILTRADAS ----------
+class ConsultaBanco:
+    """Linhas de um estado de filtros, lidas do banco por página ou em blocos.
+
+    Faz o papel do DataFrame filtrado na tabela e na exportação.
+    """
+
+    columns = COLUNAS_ESPERADAS
+
+    def __init__(self, banco, filtros):
+        self.banco = banco
+        self.filtros = filtros
+        self._linhas = None
+
+    def __len__(self):
+        if self._linhas is None:
+            onde, parametros = condicao_filtros(self.filtros)
+            self._linhas = self.banco.valor(f"SELECT COUNT(*) FROM vagas{onde}", parametros)
+        return self._linhas
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def _ler(self, sql, parametros):
+        return self.banco.consultar(sql, parametros).astype(TIPOS_COLUNAS)
+
+    def pagina(self, inicio, fim, coluna=None, crescente=True):
+        """Linhas [inicio, fim) na ordem original ou ordenadas pela coluna"""
+        onde, parametros = condicao_filtros(self.filtros)
+        sentido = "" if crescente else " DESC"
+        ordem = f"rowid{sentido}" if coluna is None else f"{coluna_sql(coluna)}{sentido}, rowid{sentido}"
+        colunas = ", ".join(coluna_sql(c) for c in COLUNAS_ESPERADAS)
+        sql = f"SELECT {colunas} FROM vagas{onde} ORDER BY {ordem} LIMIT ? OFFSET ?"
+        return self._ler(sql, parametros + [max(fim - inicio, 0), inicio])
+
+    def blocos(self, tamanho=TAMANHO_BLOCO_EXPORTACAO):
+        """Todas as linhas em blocos de `tamanho` (ao menos um, mesmo vazio), pela ordem original"""
+        colunas = ", ".join(coluna_sql(c) for c in COLUNAS_ESPERADAS)
+        ultimo = 0
+        while True:
+            # Paginação pelo rowid: cada bloco continua de onde o anterior parou
+            onde, parametros = condicao_filtros(self.filtros, [("rowid > ?", [ultimo])])
+            dados = self.banco.consultar(
+                f"SELECT rowid, {colunas} FROM vagas{onde} ORDER BY rowid LIMIT ?", parametros + [tamanho]
+            )
+            if len(dados) or not ultimo:
+                yield dados.drop(columns="rowid").astype(TIPOS_COLUNAS)
+            if len(dados) < tamanho:
+                return
+            ultimo = int(dados["rowid"].iloc[-1])
+
+    def cubo(self):
+        return CuboBanco(self.banco, self.filtros)
+
+
+# ---------- CUBO DE AGREGAÇÃO ----------
+class CuboBanco:
+    """Somas de vagas de um estado de filtros, calculadas no banco.
+
+    Mesma interface de CuboAgregacao; cada agregação é uma consulta GROUP BY
+    que devolve só o resultado, guardado para as próximas chamadas.
+    """
+
+    def __init__(self, banco, filtros):
+        self.banco = banco
+        self.filtros = filtros
+        self._somas = {}
+        self._maiores = {}
+        self._resumo = None
+
+    def _condicao(self, extras=()):
+        return condicao_filtros(self.filtros, extras)
+
+    def soma_por(self, *dimensoes):
+        """Total de vagas agrupado pelas dimensões pedidas, do maior para o menor"""
+        if dimensoes not in self._somas:
+            colunas = ", ".join(coluna_sql(d) for d in dimensoes)
+            onde, parametros = self._condicao()
+            sql = (
+                f'SELECT {colunas}, SUM("Vagas") AS "Vagas" FROM vagas{onde} '
+                f'GROUP BY {colunas} ORDER BY "Vagas" DESC, {colunas}'
+            )
+            self._somas[dimensoes] = self.banco.consultar(sql, parametros).astype({"Vagas": "int64"})
+        return self._somas[dimensoes]
+
+    def _top(self, dimensao, k):
+        """Nomes das k categorias com mais vagas, do maior para o menor, e seus totais"""
+        if (dimensao, k) not in self._maiores:
+            coluna = coluna_sql(dimensao)
+            onde, parametros = self._condicao()
+            sql = (
+                f'SELECT {coluna}, SUM("Vagas") AS "Vagas" FROM vagas{onde} '
+                f'GROUP BY {coluna} ORDER BY "Vagas" DESC, {coluna}'
+            )
+            if k is not None:
+                sql += " LIMIT ?"
+                parametros = parametros + [k]
+            self._maiores[(dimensao, k)] = self.banco.consultar(sql, parametros)
+        top = self._maiores[(dimensao, k)]
+        return top[dimensao].tolist(), top["Vagas"].tolist()
+
+    def maiores(self, dimensao, k, outros=True):
+        """As k categorias com mais vagas, do maior para o menor, e "Outros" com as demais"""
+        nomes, vagas = self._top(dimensao, k)
+        if outros and len(nomes) < self.distintos(dimensao):
+            vagas.append(self.total_vagas() - sum(vagas))
+            nomes.append(nome_outros(nomes))
+        return pd.DataFrame({
+            dimensao: pd.Categorical(nomes, categories=nomes),
+            "Vagas": pd.array(vagas, dtype="int64"),
+        })
+
+    def _faixa(self, dimensao, k, outros):
+        """Expressão SQL da dimensão limitada ao top k, condição extra e nomes em ordem"""
+        nomes, _ = self._top(dimensao, k)
+        coluna = coluna_sql(dimensao)
+        if len(nomes) == self.distintos(dimensao):
+            return coluna, [], None, nomes
+        if outros:
+            rotulo = nome_outros(nomes)
+            expressao = f"CASE WHEN {coluna} IN ({marcadores(nomes)}) THEN {coluna} ELSE ? END"
+            return expressao, nomes + [rotulo], None, nomes + [rotulo]
+        return coluna, [], (f"{coluna} IN ({marcadores(nomes)})", nomes), nomes
+
+    def maiores_cruzado(self, linhas, colunas, k_linhas=None, k_colunas=None,
+                        outros_linhas=False, outros_colunas=False):
+        """Vagas por par (linhas, colunas) só com as k maiores categorias de cada dimensão"""
+        expressao_l, parametros_l, condicao_l, nomes_l = self._faixa(linhas, k_linhas, outros_linhas)
+        expressao_c, parametros_c, condicao_c, nomes_c = self._faixa(colunas, k_colunas, outros_colunas)
+        onde, parametros = self._condicao([c for c in (condicao_l, condicao_c) if c is not None])
+        sql = (
+            f'SELECT {expressao_l} AS l, {expressao_c} AS c, SUM("Vagas") AS "Vagas" '
+            f"FROM vagas{onde} GROUP BY 1, 2"
+        )
+        pares = self.banco.consultar(sql, parametros_l + parametros_c + parametros)
+
+        resultado = pd.DataFrame({
+            linhas: pd.Categorical(pares["l"], categories=nomes_l),
+            colunas: pd.Categorical(pares["c"], categories=nomes_c),
+            "Vagas": pares["Vagas"].astype("int64"),
+        })
+        # Mesma ordem do cubo em memória: pela posição de cada categoria no top
+        ordem = resultado[linhas].cat.codes * len(nomes_c) + resultado[colunas].cat.codes
+        return resultado.iloc[ordem.argsort(kind="stable")].reset_index(drop=True)
+
+    def _obter_resumo(self):
+        if self._resumo is None:
+            distintos = ", ".join(f"COUNT(DISTINCT {coluna_sql(d)})" for d in DIMENSOES)
+            onde, parametros = self._condicao()
+            sql = f'SELECT COALESCE(SUM("Vagas"), 0), MIN("Vagas"), MAX("Vagas"), {distintos} FROM vagas{onde}'
+            valores = self.banco.consultar(sql, parametros).iloc[0].tolist()
+            self._resumo = {
+                "total": valores[0],
+                "minimo": valores[1],
+                "maximo": valores[2],
+                "distintos": dict(zip(DIMENSOES, valores[3:])),
+            }
+        return self._resumo
+
+    def total_vagas(self):
+        return self._obter_resumo()["total"]
+
+    def distintos(self, dimensao):
+        """Quantidade de valores distintos de uma dimensão"""
+        return self._obter_resumo()["distintos"][dimensao]
+
+    def minimo(self):
+        return self._obter_resumo()["minimo"]
+
+    def maximo(self):
+        return self._obter_resumo()["maximo"]
+
+
+# ---------- BANCOS DO PROCESSO ----------
+class ArmazemBancos:
+    """Bancos SQLite das planilhas importadas, um arquivo por hash de conteúdo.
+
+    Uma planilha já gravada (por qualquer sessão, ou numa execução anterior
+    do servidor) é reaberta sem nova leitura. Sessões que enviam o mesmo
+    arquivo ao mesmo tempo esperam uma única importação.
+    """
+
+    def __init__(self, diretorio):
+        self.diretorio = Path(diretorio)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self._bancos = {}
+        self._trava = threading.Lock()
+        self._travas_chaves = TravasPorChave()
+
+    def obter_ou_criar(self, chave, criar):
+        """Banco da chave; se ainda não existe, `criar(caminho)` grava o arquivo.
+
+        `criar` devolve (relatorio_erros, mensagem), como `importar_para_banco`.
+        Retorna (banco, relatorio_erros, mensagem); banco é None se a planilha
+        não puder ser usada.
+        """
+        with self._travas_chaves.travar(chave):
+            banco = self._abrir(chave)
+            if banco is not None:
+                return banco, banco.relatorio_erros(), banco.mensagem()
+
+            relatorio_erros, mensagem = criar(self.diretorio / f"{chave}.sqlite")
+            return self._abrir(chave), relatorio_erros, mensagem
+
+    def obter(self, chave):
+        """(banco, relatorio_erros, mensagem) de uma planilha já gravada, ou (None, None, None)"""
+        banco = self._abrir(chave)
+        if banco is None:
+            return None, None, None
+        return banco, banco.relatorio_erros(), banco.mensagem()
+
+    def _abrir(self, chave):
+        with self._trava:
+            if chave in self._bancos:
+                return self._bancos[chave]
+        caminho = self.diretorio / f"{chave}.sqlite"
+        if not caminho.exists():
+            return None
+        banco = BancoVagas(caminho)
+        with self._trava:
+            return self._bancos.setdefault(chave, banco)
@@ -0,0 +1,283 @@
+"""Benchmark do pipeline de dados do painel, sem navegador.
+
+Executa as etapas do app.py (geração, leitura, validação, carga, índices,
+filtros, agregação e figura de cada visualização, estatísticas, comparação
+entre versões e exportação, também com o armazenamento em SQLite) sobre dados fictícios de vários
+tamanhos, medindo tempo e pico de memória de cada uma, e grava um relatório
+JSON para comparar versões.
+
+Uso:
+    python benchmark.py
+    python benchmark.py --tamanhos 1k,100k --saida resultados.json
+    python benchmark.py --comparar resultados_anteriores.json
+"""
+import argparse
+import gc
+import io
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly
+
+from banco import BancoVagas, importar_para_banco
+from dados import (
+    ESCALAS_DADOS_FICTICIOS, FORMATOS_EXPORTACAO, LIMITE_LINHAS_XLSX, SEMENTE_PADRAO,
+    CuboAgregacao, DiferencaVersoes, HierarquiaFiltros, IndiceFiltros, exportar_dados,
+    gerar_dados_ficticios, importar_planilha, resumo_estatistico, validar_dados_importados,
+)
+from graficos import (
+    figura_barras, figura_barras_empilhadas, figura_mapa_calor,
+    figura_pizza_cargo, figura_pizza_regiao, figura_treemap,
+)
+
+# Tamanho -> parâmetros de gerar_dados_ficticios
+TAMANHOS = {
+    "1k": {"n_municipios": 40, "n_hospitais_por_municipio": 1},
+    "100k": ESCALAS_DADOS_FICTICIOS["~100 mil linhas"],
+    "1M": ESCALAS_DADOS_FICTICIOS["~1 milhão de linhas"],
+    "10M": ESCALAS_DADOS_FICTICIOS["~10 milhões de linhas"],
+}
+
+# Visualização -> função que monta a figura a partir do cubo
+GRAFICOS = {
+    "barras": lambda cubo: figura_barras(cubo, "Município"),
+    "mapa_calor": figura_mapa_calor,
+    "pizza": lambda cubo: (figura_pizza_regiao(cubo), figura_pizza_cargo(cubo)),
+    "barras_empilhadas": figura_barras_empilhadas,
+    "treemap": figura_treemap,
+}
+
+# Acima deste número de linhas o XLSX é pulado por padrão (openpyxl é lento)
+LIMITE_XLSX_PADRAO = 50_000
+
+# Variação a partir da qual a comparação aponta regressão
+LIMITE_REGRESSAO = 1.2
+
+
+class Medidor:
+    """Registra tempo e pico de memória (via tracemalloc) de cada etapa"""
+
+    def __init__(self, medir_memoria=True):
+        self.medir_memoria = medir_memoria
+        self.resultados = []
+
+    def medir(self, tamanho, etapa, funcao, *args, preparar=None, **kwargs):
+        """Executa a etapa e devolve o retorno da passada cronometrada.
+
+        O tempo vem de uma passada sem tracemalloc, que deixa as etapas mais
+        lentas e de forma desigual; o pico de memória, de uma segunda passada
+        só para isso. Etapas que alteram o próprio argumento (o cubo guarda as
+        somas) usam `preparar`: chamado fora da medição antes de cada passada,
+        seu retorno vira o primeiro argumento de `funcao`.
+        """
+        argumentos = args if preparar is None else (preparar(), *args)
+        gc.collect()
+        inicio = time.perf_counter()
+        retorno = funcao(*argumentos, **kwargs)
+        segundos = time.perf_counter() - inicio
+
+        resultado = {"tamanho": tamanho, "etapa": etapa, "segundos": round(segundos, 4)}
+        if self.medir_memoria:
+            argumentos = args if preparar is None else (preparar(), *args)
+            gc.collect()
+            tracemalloc.start()
+            try:
+                funcao(*argumentos, **kwargs)
+                pico = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            resultado["pico_memoria_mb"] = round(pico / 2**20, 2)
+        self.resultados.append(resultado)
+
+        memoria = f"{resultado['pico_memoria_mb']:>10.1f} MB" if self.medir_memoria else ""
+        print(f"  {etapa:<40} {segundos:>9.3f} s{memoria}", flush=True)
+        return retorno
+
+
+def filtros_representativos(df):
+    """Maior região de saúde com os 5 cargos de mais vagas"""
+    regiao = df.groupby("Região de Saúde", observed=True)["Vagas"].sum().idxmax()
+    cargos = df.groupby("Cargo", observed=True)["Vagas"].sum().nlargest(5).index.tolist()
+    return {"Região de Saúde": [regiao], "Cargo": cargos}
+
+
+def nova_versao(df, fracao=0.01, semente=SEMENTE_PADRAO):
+    """Cópia dos dados com as vagas de uma fração das linhas alteradas (retificação)"""
+    linhas = np.random.default_rng(semente).choice(len(df), size=max(1, int(len(df) * fracao)), replace=False)
+    vagas = df["Vagas"].to_numpy(np.int64).copy()
+    vagas[linhas] += 1
+    return df.assign(Vagas=vagas.astype(df["Vagas"].dtype))
+
+
+def cubo_com_marginais(df):
+    """Cubo com as somas usadas pelos gráficos e estatísticas já calculadas"""
+    cubo = CuboAgregacao(df)
+    for dimensoes in [("Município",), ("Cargo",), ("Região de Saúde",), ("Hospital",), ("Região de Saúde", "Município")]:
+        cubo.soma_por(*dimensoes)
+    return cubo
+
+
+def exportar_para_arquivo(df, formato):
+    """Exporta para um arquivo temporário e devolve o tamanho gerado, em bytes"""
+    with tempfile.TemporaryFile() as arquivo:
+        exportar_dados(df, formato, arquivo)
+        arquivo.flush()
+        return arquivo.tell()
+
+
+def executar_tamanho(medidor, tamanho, limite_xlsx):
+    parametros = TAMANHOS[tamanho]
+    print(f"\n== {tamanho} ==", flush=True)
+
+    df = medidor.medir(tamanho, "geracao", gerar_dados_ficticios, SEMENTE_PADRAO, **parametros)
+    linhas = len(df)
+    print(f"  ({linhas} linhas)")
+
+    # Exportação (o CSV gerado também alimenta as etapas de carga)
+    for formato in FORMATOS_EXPORTACAO:
+        if formato == "Excel (.xlsx)" and linhas > min(limite_xlsx, LIMITE_LINHAS_XLSX):
+            print(f"  {'exportacao ' + formato:<40} pulado ({linhas} linhas)")
+            continue
+        medidor.medir(tamanho, f"exportacao {formato}", exportar_para_arquivo, df, formato)
+
+    buffer = io.BytesIO()
+    exportar_dados(df, "CSV", buffer)
+    conteudo = buffer.getvalue()
+    del buffer
+
+    # Carga: leitura simples, validação e o pipeline completo de importação
+    bruto = medidor.medir(tamanho, "leitura_csv", pd.read_csv, preparar=lambda: io.BytesIO(conteudo), dtype=str)
+    medidor.medir(tamanho, "validacao", validar_dados_importados, bruto)
+    del bruto
+    medidor.medir(tamanho, "importacao_completa", importar_planilha, conteudo, "dados.csv")
+
+    # Filtros
+    indice = medidor.medir(tamanho, "indice_filtros", IndiceFiltros, df)
+    medidor.medir(tamanho, "hierarquia_filtros", HierarquiaFiltros, df)
+    filtros = filtros_representativos(df)
+    df_filtrado = medidor.medir(tamanho, "filtro", indice.aplicar, df, filtros)
+    medidor.medir(tamanho, "cubo_filtrado", CuboAgregacao, df_filtrado)
+    del df_filtrado
+
+    # Visualizações sem filtros (visão inicial do painel): cada uma com um cubo
+    # novo, para medir agregação + figura e, em seguida, só a figura
+    medidor.medir(tamanho, "cubo", CuboAgregacao, df)
+    for nome, construir in GRAFICOS.items():
+        medidor.medir(tamanho, f"grafico_{nome}", construir, preparar=lambda: CuboAgregacao(df))
+        cubo_pronto = CuboAgregacao(df)
+        construir(cubo_pronto)
+        medidor.medir(tamanho, f"grafico_{nome} (so figura)", construir, cubo_pronto)
+    medidor.medir(tamanho, "estatisticas", resumo_estatistico, preparar=lambda: CuboAgregacao(df))
+
+    # Nova versão dos dados: diferença entre versões e cubo atualizado só com as
+    # linhas alteradas, comparado com refazer o cubo inteiro
+    df_nova = nova_versao(df)
+    diferenca = medidor.medir(tamanho, "diferenca_versoes", DiferencaVersoes, df, df_nova)
+    cubo_anterior = cubo_com_marginais(df)
+    medidor.medir(tamanho, "cubo_incremental", cubo_anterior.com_delta, *diferenca.linhas_alteradas({}))
+    medidor.medir(tamanho, "cubo_nova_versao_completo", cubo_com_marginais, df_nova)
+    del df_nova, diferenca, cubo_anterior
+
+    # Armazenamento em SQLite: importação e as mesmas agregações feitas no banco
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = Path(diretorio) / "dados.sqlite"
+        medidor.medir(tamanho, "importacao_sqlite", importar_para_banco, caminho, conteudo, "dados.csv")
+        banco = BancoVagas(caminho)
+        medidor.medir(tamanho, "hierarquia_sqlite", banco.hierarquia)
+        medidor.medir(tamanho, "estatisticas_sqlite_filtrado", lambda: resumo_estatistico(banco.filtrar(filtros).cubo()))
+        for nome, construir in GRAFICOS.items():
+            medidor.medir(tamanho, f"grafico_{nome}_sqlite", construir, preparar=lambda: banco.filtrar({}).cubo())
+
+    return linhas
+
+
+def versao_do_codigo():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(atual, anterior):
+    """Imprime a variação de tempo por etapa em relação a um relatório anterior.
+
+    Relatórios com e sem medição de memória não são comparados: nas versões
+    antigas do benchmark o tracemalloc ficava ligado durante a cronometragem.
+    """
+    if atual.get("memoria_medida") != anterior.get("memoria_medida"):
+        print(
+            "\n⚠️ Comparação não feita: só um dos relatórios mediu memória "
+            f"(atual: {atual.get('memoria_medida')}, anterior: {anterior.get('memoria_medida')}). "
+            "Gere os dois com as mesmas opções.",
+            flush=True
+        )
+        return
+    tempos_anteriores = {(r["tamanho"], r["etapa"]): r["segundos"] for r in anterior["resultados"]}
+    print(f"\n== Comparação com {anterior.get('versao') or 'relatório anterior'} ==")
+    for r in atual["resultados"]:
+        antes = tempos_anteriores.get((r["tamanho"], r["etapa"]))
+        if not antes:
+            continue
+        razao = r["segundos"] / antes
+        alerta = "  ⚠️ regressão" if razao > LIMITE_REGRESSAO else ""
+        print(f"  {r['tamanho']:>5} {r['etapa']:<40} {antes:>9.3f} s -> {r['segundos']:>9.3f} s ({razao:.2f}x){alerta}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanhos", default=",".join(TAMANHOS),
+                        help=f"tamanhos separados por vírgula (padrão: {','.join(TAMANHOS)})")
+    parser.add_argument("--saida", default="benchmark_resultados.json", help="arquivo JSON do relatório")
+    parser.add_argument("--comparar", help="relatório JSON anterior para comparação")
+    parser.add_argument("--limite-xlsx", type=int, default=LIMITE_XLSX_PADRAO,
+                        help="pula a exportação XLSX acima deste número de linhas")
+    parser.add_argument("--sem-memoria", action="store_true",
+                        help="não mede memória (evita a segunda passada de cada etapa, com tracemalloc)")
+    args = parser.parse_args()
+
+    tamanhos = [t.strip() for t in args.tamanhos.split(",") if t.strip()]
+    desconhecidos = [t for t in tamanhos if t not in TAMANHOS]
+    if desconhecidos:
+        parser.error(f"tamanhos desconhecidos: {desconhecidos} (use {list(TAMANHOS)})")
+
+    medidor = Medidor(medir_memoria=not args.sem_memoria)
+
+    linhas = {tamanho: executar_tamanho(medidor, tamanho, args.limite_xlsx) for tamanho in tamanhos}
+
+    relatorio = {
+        "gerado_em": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "versao": versao_do_codigo(),
+        "ambiente": {
+            "python": sys.version.split()[0],
+            "plataforma": platform.platform(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "plotly": plotly.__version__,
+        },
+        "memoria_medida": medidor.medir_memoria,
+        "linhas": linhas,
+        "resultados": medidor.resultados,
+    }
+    with open(args.saida, "w", encoding="utf-8") as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+    print(f"\nRelatório gravado em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            comparar(relatorio, json.load(arquivo))
+
+
+if __name__ == "__main__":
+    main()
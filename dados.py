@@ -0,0 +1,1384 @@
+"""Dados das vagas: geração, importação, validação, índices, agregação e exportação.
+
+Nada aqui depende do Streamlit; o app.py aplica os caches da interface por cima
+destas funções e o benchmark.py as chama diretamente.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# ---------- ESTRUTURA DOS DADOS ----------
+COLUNAS_ESPERADAS = ["Município", "Região de Saúde", "Hospital", "Cargo", "Vagas"]
+DIMENSOES = ["Região de Saúde", "Município", "Hospital", "Cargo"]
+
+def tamanho_em_bytes(df):
+    """Memória ocupada pelo DataFrame, incluindo o conteúdo das strings"""
+    return int(df.memory_usage(deep=True).sum())
+
+def tamanho_como_texto(df):
+    """Memória que o DataFrame ocuparia com as dimensões como texto (object) e Vagas em int64.
+
+    É a forma em que os dados eram lidos antes da codificação. As colunas
+    categóricas são medidas pelas categorias, sem montar as strings.
+    """
+    total = int(df.index.memory_usage(deep=True))
+    for col in df.columns:
+        coluna = df[col]
+        if isinstance(coluna.dtype, pd.CategoricalDtype):
+            # Um ponteiro por linha mais o objeto de cada valor (NaN para código -1)
+            tamanhos = np.array([np.nan.__sizeof__()] + [str(c).__sizeof__() for c in coluna.cat.categories])
+            contagem = np.bincount(coluna.cat.codes.to_numpy() + 1, minlength=len(tamanhos))
+            total += 8 * len(coluna) + int(contagem @ tamanhos)
+        elif pd.api.types.is_numeric_dtype(coluna.dtype):
+            total += 8 * len(coluna)
+        else:
+            total += int(coluna.astype(object).memory_usage(deep=True, index=False))
+    return total
+
+def formatar_bytes(n):
+    """Tamanho em bytes em formato legível"""
+    if n < 1024 * 1024:
+        return f"{n / 1024:.1f} KB"
+    return f"{n / (1024 * 1024):.1f} MB"
+
+def normalizar_dados(df):
+    """Representação compacta: dimensões como category e Vagas no menor inteiro sem sinal.
+
+    As categorias ficam em ordem alfabética, então os códigos são sempre os mesmos
+    para o mesmo conjunto de valores. O uso de memória como texto (a forma
+    original, mesmo que os dados já cheguem codificados) fica em
+    `df.attrs["memoria_original"]`.
+    """
+    memoria_original = tamanho_como_texto(df)
+    
+    compacto = df.copy()
+    for col in DIMENSOES:
+        if isinstance(compacto[col].dtype, pd.CategoricalDtype):
+            # Já codificada: só garante a ordem alfabética das categorias
+            categorias = compacto[col].cat.categories
+            compacto[col] = compacto[col].cat.reorder_categories(sorted(categorias))
+            continue
+        texto = compacto[col].astype("string")
+        categorias = sorted(texto.dropna().unique())
+        compacto[col] = pd.Categorical(texto, categories=categorias)
+    compacto["Vagas"] = pd.to_numeric(compacto["Vagas"], downcast="unsigned")
+    
+    compacto.attrs["memoria_original"] = memoria_original
+    return compacto
+
+
+# ---------- DADOS FICTÍCIOS ----------
+# Semente padrão: os dados fictícios são os mesmos em qualquer processo
+SEMENTE_PADRAO = 42
+
+# Tamanhos pré-definidos para testes de carga (parâmetros de gerar_dados_ficticios)
+ESCALAS_DADOS_FICTICIOS = {
+    "Protótipo (15 municípios)": {},
+    "~100 mil linhas": {"n_municipios": 1_000, "n_hospitais_por_municipio": 4},
+    "~1 milhão de linhas": {"n_municipios": 5_000, "n_hospitais_por_municipio": 7},
+    "~10 milhões de linhas": {"n_municipios": 5_570, "n_hospitais_por_municipio": 7, "n_cargos": 60, "n_concursos": 5},
+}
+
+def codificar_ordenado(nomes, codigos):
+    """Coluna category com categorias em ordem alfabética a partir de nomes[codigos]"""
+    nomes = np.asarray(nomes, dtype=object)
+    ordem = np.argsort(nomes)
+    posicao = np.empty(len(nomes), dtype=np.int32)
+    posicao[ordem] = np.arange(len(nomes), dtype=np.int32)
+    return pd.Categorical.from_codes(posicao[codigos], categories=nomes[ordem])
+
+def gerar_dados_ficticios(semente=SEMENTE_PADRAO, n_municipios=15, n_hospitais_por_municipio=None, n_cargos=33, n_concursos=1):
+    """Gera dados fictícios para o protótipo ou, ampliando os parâmetros, para testes de carga.
+
+    Além dos 15 municípios, 33 cargos e um concurso reais, são criados
+    municípios, cargos e concursos sintéticos. `n_hospitais_por_municipio` fixa
+    quantos hospitais cada município tem (None = os hospitais reais, um nos
+    sintéticos). Com mais de um concurso é incluída a coluna "Concurso".
+    """
+    
+    # Municípios com hospitais estaduais (17 unidades)
+    municipios = [
+        "Palmas", "Araguaína", "Gurupi", "Porto Nacional", "Paraíso do Tocantins",
+        "Arraias", "Pedro Afonso", "Guaraí", "Dianópolis", "Alvorada",
+        "Miracema do Tocantins", "Xambioá", "Arapoema", "Araguaçu", "Augustinópolis"
+    ]
+
+    # 8 REGIÕES DE SAÚDE OFICIAIS DO TOCANTINS (PDR 2014)
+    regioes_saude = [
+        "Bico do Papagaio",
+        "Médio Norte Araguaia",
+        "Cerrado Tocantins Araguaia",
+        "Cantão",
+        "Capim Dourado",
+        "Amor Perfeito",
+        "Ilha do Bananal",
+        "Sudeste"
+    ]
+
+    # Mapeamento município -> região
+    municipio_regiao = {
+        "Palmas": "Capim Dourado",
+        "Porto Nacional": "Amor Perfeito",
+        "Paraíso do Tocantins": "Cantão",
+        "Miracema do Tocantins": "Capim Dourado",
+        "Araguaína": "Médio Norte Araguaia",
+        "Xambioá": "Médio Norte Araguaia",
+        "Arapoema": "Cerrado Tocantins Araguaia",
+        "Pedro Afonso": "Cerrado Tocantins Araguaia",
+        "Guaraí": "Médio Norte Araguaia",
+        "Gurupi": "Ilha do Bananal",
+        "Alvorada": "Ilha do Bananal",
+        "Araguaçu": "Ilha do Bananal",
+        "Dianópolis": "Sudeste",
+        "Arraias": "Sudeste",
+        "Augustinópolis": "Bico do Papagaio"
+    }
+
+    # Dicionário com os nomes dos hospitais
+    hospitais_por_municipio = {
+        "Palmas": [
+            "Hospital Geral de Palmas (HGP) - com ala pediátrica", 
+            "Hospital e Maternidade Dona Regina"
+        ],
+        "Araguaína": ["Hospital Regional de Araguaína", "Hospital Materno Infantil Tia Dedé"],
+        "Gurupi": ["Hospital Regional de Gurupi"],
+        "Porto Nacional": ["Hospital Regional de Porto Nacional"],
+        "Paraíso do Tocantins": ["Hospital Regional de Paraíso do Tocantins"],
+        "Augustinópolis": ["Hospital Regional de Augustinópolis"],
+        "Dianópolis": ["Hospital Regional de Dianópolis"],
+        "Arraias": ["Hospital Regional de Arraias"],
+        "Guaraí": ["Hospital Regional de Guaraí"],
+        "Pedro Afonso": ["Hospital Regional de Pedro Afonso"],
+        "Miracema do Tocantins": ["Hospital Regional de Miracema"],
+        "Xambioá": ["Hospital Regional de Xambioá"],
+        "Alvorada": ["Hospital Regional de Alvorada"],
+        "Araguaçu": ["Hospital Regional de Araguaçu"],
+        "Arapoema": ["Hospital e Maternidade Irmã Rita"]
+    }
+
+    # Cargos conforme Lei 2.670/2012
+    cargos = [
+        "Analista em Controle de Zoonoses", "Assistente Social", "Biólogo em Saúde",
+        "Biomédico", "Enfermeiro", "Farmacêutico", "Farmacêutico-Bioquímico",
+        "Fonoaudiólogo", "Nutricionista", "Psicólogo", "Tecnólogo",
+        "Cirurgião-Dentista", "Médico", "Fisioterapeuta", "Terapeuta Ocupacional",
+        "Administrador Hospitalar", "Auditor em Saúde", "Engenheiro Clínico",
+        "Executivo em Saúde", "Inspetor em Vigilância Sanitária",
+        "Pesquisador Docente em Saúde Pública", "Gestor em Saúde", "Físico",
+        "Instrumentador Cirúrgico", "Técnico em Imobilização Ortopédica",
+        "Técnico de Saúde Bucal", "Técnico em Enfermagem", "Técnico em Laboratório",
+        "Técnico em Radiologia", "Assistente de Serviços de Saúde",
+        "Auxiliar de Serviços de Saúde", "Auxiliar de Enfermagem", "Auxiliar de Laboratório"
+    ]
+
+    # Ampliar as listas com municípios e cargos sintéticos
+    for i in range(len(municipios), n_municipios):
+        municipio = f"Município Sintético {i + 1:05d}"
+        municipios.append(municipio)
+        municipio_regiao[municipio] = regioes_saude[i % len(regioes_saude)]
+    municipios = municipios[:n_municipios]
+    cargos = (cargos + [f"Cargo Sintético {i + 1:03d}" for i in range(len(cargos), n_cargos)])[:n_cargos]
+    
+    # Hospitais de cada município (reais primeiro, completados com unidades sintéticas)
+    hospitais, hospital_municipio = [], []
+    for m, municipio in enumerate(municipios):
+        nomes = list(hospitais_por_municipio.get(municipio, []))
+        quantidade = n_hospitais_por_municipio or max(len(nomes), 1)
+        nomes += [f"Unidade {j + 1} de {municipio}" for j in range(len(nomes), quantidade)]
+        hospitais += nomes[:quantidade]
+        hospital_municipio += [m] * quantidade
+    hospital_municipio = np.asarray(hospital_municipio, dtype=np.int32)
+    
+    # Vagas máximas por porte do município
+    max_vagas = np.array([
+        25 if municipio in ["Palmas", "Araguaína", "Gurupi"]
+        else 15 if municipio in ["Porto Nacional", "Paraíso do Tocantins", "Augustinópolis"]
+        else 10
+        for municipio in municipios
+    ])
+    
+    # Faixa de vagas por grupo de cargo
+    grupo_cargo = np.array([
+        0 if cargo in ["Médico", "Enfermeiro", "Técnico em Enfermagem"]
+        else 1 if cargo in ["Auxiliar de Enfermagem", "Auxiliar de Laboratório"]
+        else 2 if cargo in ["Gestor em Saúde", "Executivo em Saúde", "Pesquisador Docente em Saúde Pública"]
+        else 3
+        for cargo in cargos
+    ])
+    
+    # Gerar dados: uma linha por concurso x hospital x cargo, sorteadas de uma vez
+    n_hospitais, n_cargos = len(hospitais), len(cargos)
+    idx_hospital = np.tile(np.repeat(np.arange(n_hospitais, dtype=np.int32), n_cargos), n_concursos)
+    idx_cargo = np.tile(np.arange(n_cargos, dtype=np.int32), n_hospitais * n_concursos)
+    idx_municipio = hospital_municipio[idx_hospital]
+    
+    maximo = max_vagas[idx_municipio]
+    grupo = grupo_cargo[idx_cargo]
+    baixo = np.where(grupo == 0, 2, 0)
+    alto = np.select([grupo == 0, grupo == 1, grupo == 2], [maximo, 3, 2], default=maximo // 2)
+    
+    rng = np.random.default_rng(semente)
+    vagas = rng.integers(baixo, alto + 1, dtype=np.int64)
+    
+    # Manter só combinações com vagas
+    manter = vagas > 0
+    idx_hospital, idx_cargo, idx_municipio, vagas = idx_hospital[manter], idx_cargo[manter], idx_municipio[manter], vagas[manter]
+    
+    regioes = [municipio_regiao[municipio] for municipio in municipios]
+    regioes_unicas = sorted(set(regioes))
+    regiao_do_municipio = np.array([regioes_unicas.index(regiao) for regiao in regioes], dtype=np.int32)
+    
+    df = pd.DataFrame({
+        "Município": codificar_ordenado(municipios, idx_municipio),
+        "Região de Saúde": codificar_ordenado(regioes_unicas, regiao_do_municipio[idx_municipio]),
+        "Hospital": codificar_ordenado(hospitais, idx_hospital),
+        "Cargo": codificar_ordenado(cargos, idx_cargo),
+        "Vagas": vagas,
+    })
+    if n_concursos > 1:
+        concursos = [f"Concurso {2024 - 2 * i}" for i in range(n_concursos)]
+        idx_concurso = np.repeat(np.arange(n_concursos, dtype=np.int32), n_hospitais * n_cargos)[manter]
+        df["Concurso"] = codificar_ordenado(concursos, idx_concurso)
+
+    return normalizar_dados(df)
+
+
+# ---------- FUNÇÃO PARA VALIDAR DADOS IMPORTADOS ----------
+# Máximo de linhas com erro guardadas no relatório (as demais só são contadas)
+LIMITE_RELATORIO_ERROS = 10_000
+
+# Maior número de vagas aceito numa linha; bem abaixo do int64, para que a
+# soma de muitas linhas também caiba
+MAXIMO_VAGAS = 1_000_000_000
+
+def validar_colunas(colunas_recebidas):
+    """Verifica se todas as colunas esperadas existem"""
+    for col in COLUNAS_ESPERADAS:
+        if col not in colunas_recebidas:
+            return False, f"Coluna '{col}' não encontrada. Colunas encontradas: {colunas_recebidas}"
+    return True, "Colunas válidas"
+
+def chave_nome(nome):
+    """Forma de comparação de nomes: sem acentos, sem diferença de maiúsculas"""
+    sem_acentos = unicodedata.normalize("NFKD", nome).encode("ascii", "ignore").decode("ascii")
+    return sem_acentos.casefold()
+
+def validar_bloco(bloco, nomes_canonicos):
+    """Valida e padroniza um bloco de linhas da planilha, de forma vetorizada.
+
+    O índice do bloco é a posição da linha de dados (0 = primeira linha depois
+    do cabeçalho), usada para informar a linha da planilha nos erros.
+    `nomes_canonicos` guarda, por coluna, a primeira grafia vista de cada nome e
+    é atualizado aqui, para que "PALMAS" e "Palmas " virem o mesmo município em
+    todos os blocos. Retorna as linhas válidas e um DataFrame com os erros
+    (Linha, Coluna, Valor, Problema).
+    """
+    linhas = bloco.index.to_numpy() + 2
+    limpo = pd.DataFrame(index=bloco.index)
+    invalidas = np.zeros(len(bloco), dtype=bool)
+    erros = []
+    
+    def registrar(mascara, coluna, valores, problema):
+        if mascara.any():
+            erros.append(pd.DataFrame({
+                "Linha": linhas[mascara],
+                "Coluna": coluna,
+                "Valor": pd.Series(valores[mascara], dtype=object).astype("string").fillna("").to_numpy(),
+                "Problema": problema
+            }))
+    
+    for col in DIMENSOES:
+        # Cada nome distinto é tratado uma só vez: espaços extras removidos e
+        # acentos/maiúsculas unificados pela grafia canônica
+        codigos, distintos = pd.factorize(bloco[col])
+        canonicos = nomes_canonicos.setdefault(col, {})
+        nomes = []
+        for valor in distintos:
+            nome = " ".join(str(valor).split())
+            nomes.append(canonicos.setdefault(chave_nome(nome), nome) if nome else "")
+        
+        ids_nomes, categorias = pd.factorize(np.asarray(nomes, dtype=object))
+        # Código -1 (célula vazia) aponta para o último elemento acrescentado
+        codigos = np.append(ids_nomes, -1)[codigos]
+        vazio = np.append(categorias == "", True)[codigos]
+        registrar(vazio, col, bloco[col].to_numpy(), "valor vazio")
+        invalidas |= vazio
+        limpo[col] = pd.Categorical.from_codes(np.where(vazio, -1, codigos), categories=categorias)
+    
+    # Conversão numérica feita sobre os valores distintos da coluna
+    originais = bloco["Vagas"].to_numpy()
+    codigos, distintos = pd.factorize(bloco["Vagas"])
+    numeros = (
+        pd.to_numeric(pd.Series(distintos, dtype=object).astype("string").str.strip(), errors="coerce")
+        .astype("Float64")
+        .to_numpy(dtype=float, na_value=np.nan)
+    )
+    vagas = np.append(numeros, np.nan)[codigos]
+    
+    nao_numerico = ~np.isfinite(vagas)
+    registrar(nao_numerico, "Vagas", originais, "não é um número")
+    negativo = vagas < 0
+    registrar(negativo, "Vagas", originais, "valor negativo")
+    fracionario = ~nao_numerico & (vagas != np.floor(vagas))
+    registrar(fracionario, "Vagas", originais, "não é um número inteiro")
+    grande_demais = vagas > MAXIMO_VAGAS
+    registrar(grande_demais, "Vagas", originais, f"acima do máximo de {MAXIMO_VAGAS:_} vagas".replace("_", "."))
+    invalidas |= nao_numerico | negativo | fracionario | grande_demais
+    
+    limpo["Vagas"] = np.where(invalidas, 0, vagas).astype(np.int64)
+    relatorio = None
+    if erros:
+        relatorio = pd.concat(erros).sort_values("Linha", kind="stable", ignore_index=True)
+    return limpo[~invalidas], relatorio
+
+def validar_dados_importados(df):
+    """Verifica se o DataFrame importado tem a estrutura correta"""
+    
+    valido, mensagem = validar_colunas(df.columns.tolist())
+    if not valido:
+        return False, mensagem
+    
+    # Verificar se há dados
+    if df.empty:
+        return False, "O arquivo está vazio"
+    
+    # Verificar o conteúdo linha a linha
+    _, relatorio = validar_bloco(df.reset_index(drop=True), {})
+    if relatorio is not None:
+        primeiro = relatorio.iloc[0]
+        return False, f"Linha {primeiro['Linha']}, coluna '{primeiro['Coluna']}': {primeiro['Problema']} ({primeiro['Valor']})"
+    
+    return True, "Dados válidos"
+
+
+# ---------- LEITURA DAS PLANILHAS EM BLOCOS ----------
+# Linhas lidas e validadas por vez
+TAMANHO_BLOCO_LEITURA = 100_000
+
+def ler_blocos_csv(conteudo, tamanho_bloco):
+    """Blocos de um CSV, com o total estimado de linhas (todas as células como texto).
+
+    Como no XLSX, o índice é a posição da linha no arquivo (0 = primeira
+    linha depois do cabeçalho): linhas em branco são descartadas sem
+    renumerar, e quebras de linha dentro de campos entre aspas são contadas.
+    """
+    total_estimado = max(conteudo.count(b"\n") - 1, 1)
+    leitor = pd.read_csv(io.BytesIO(conteudo), dtype=str, chunksize=tamanho_bloco, skip_blank_lines=False)
+    # Sem aspas no arquivo não há campos com quebra de linha
+    tem_aspas = b'"' in conteudo
+    
+    def blocos():
+        with leitor:
+            inicio = 0
+            deslocamento = 0
+            for i, bloco in enumerate(leitor):
+                if i == 0 and tem_aspas:
+                    deslocamento = sum(str(c).count("\n") for c in bloco.columns)
+                posicoes = np.arange(inicio, inicio + len(bloco)) + deslocamento
+                inicio += len(bloco)
+                if tem_aspas:
+                    quebras = sum(
+                        bloco[col].str.count("\n").fillna(0).to_numpy(dtype=np.int64) for col in bloco.columns
+                    )
+                    if np.any(quebras):
+                        # Cada linha começa depois das quebras das anteriores
+                        acumuladas = np.cumsum(quebras)
+                        posicoes = posicoes + acumuladas - quebras
+                        deslocamento += int(acumuladas[-1])
+                bloco.index = posicoes
+                # Linhas totalmente em branco (comuns no fim de planilhas) são ignoradas
+                yield bloco[bloco.notna().any(axis=1)]
+    
+    return blocos(), total_estimado
+
+def ler_blocos_xlsx(conteudo, tamanho_bloco):
+    """Blocos da primeira aba de um XLSX, lidos no modo read-only do openpyxl"""
+    from openpyxl import load_workbook
+    
+    planilha = load_workbook(io.BytesIO(conteudo), read_only=True, data_only=True)
+    aba = planilha.worksheets[0]
+    total_estimado = max((aba.max_row or 2) - 1, 1)
+    
+    def blocos():
+        try:
+            linhas = aba.iter_rows(values_only=True)
+            cabecalho = [str(c).strip() if c is not None else "" for c in next(linhas, ())]
+            largura = len(cabecalho)
+            pendentes, posicoes = [], []
+            emitiu = False
+            for posicao, linha in enumerate(linhas):
+                # Linhas totalmente em branco (comuns no fim de planilhas) são ignoradas
+                if all(valor is None for valor in linha):
+                    continue
+                pendentes.append(tuple(linha[:largura]) + (None,) * (largura - len(linha)))
+                posicoes.append(posicao)
+                if len(pendentes) >= tamanho_bloco:
+                    yield pd.DataFrame(pendentes, columns=cabecalho, index=posicoes)
+                    pendentes, posicoes = [], []
+                    emitiu = True
+            if pendentes or not emitiu:
+                yield pd.DataFrame(pendentes, columns=cabecalho, index=posicoes)
+        finally:
+            planilha.close()
+    
+    return blocos(), total_estimado
+
+class ImportacaoCancelada(Exception):
+    """A leitura da planilha foi interrompida pelo `cancelamento`"""
+
+class LeituraPlanilha:
+    """Leitura de uma planilha em blocos já validados, com memória limitada.
+
+    `blocos_validos()` devolve só as linhas válidas de cada bloco; as linhas
+    com erro ficam no relatório. `progresso(linhas_lidas, total_estimado)` é
+    chamado após cada bloco. Se o cabeçalho for inválido, nenhum bloco é
+    devolvido e `erro` traz a mensagem. Quando o `cancelamento` (um
+    `threading.Event`) é marcado, a leitura para com `ImportacaoCancelada`
+    antes do próximo bloco.
+    """
+
+    def __init__(self, conteudo, nome_arquivo, progresso=None, tamanho_bloco=TAMANHO_BLOCO_LEITURA,
+                 cancelamento=None):
+        self.conteudo = conteudo
+        self.nome_arquivo = nome_arquivo
+        self.progresso = progresso
+        self.tamanho_bloco = tamanho_bloco
+        self.cancelamento = cancelamento
+        self.erro = None
+        self.linhas_lidas = 0
+        self.linhas_descartadas = 0
+        self._erros = []
+
+    def blocos_validos(self):
+        if self.nome_arquivo.lower().endswith('.csv'):
+            blocos, total_estimado = ler_blocos_csv(self.conteudo, self.tamanho_bloco)
+        else:
+            blocos, total_estimado = ler_blocos_xlsx(self.conteudo, self.tamanho_bloco)
+        
+        nomes_canonicos = {}
+        for i, bloco in enumerate(blocos):
+            if self.cancelamento is not None and self.cancelamento.is_set():
+                raise ImportacaoCancelada(self.nome_arquivo)
+            bloco.columns = [str(c).strip() for c in bloco.columns]
+            if i == 0:
+                valido, mensagem = validar_colunas(bloco.columns.tolist())
+                if not valido:
+                    self.erro = mensagem
+                    return
+            
+            validas, relatorio = validar_bloco(bloco, nomes_canonicos)
+            # O relatório tem um problema por célula; aqui contam as linhas
+            self.linhas_descartadas += len(bloco) - len(validas)
+            if relatorio is not None:
+                if sum(len(e) for e in self._erros) < LIMITE_RELATORIO_ERROS:
+                    self._erros.append(relatorio)
+            
+            self.linhas_lidas += len(bloco)
+            yield validas
+            if self.progresso is not None:
+                self.progresso(self.linhas_lidas, max(total_estimado, self.linhas_lidas))
+        
+        if self.linhas_lidas == 0:
+            self.erro = "O arquivo está vazio"
+
+    def relatorio_erros(self):
+        """Linhas descartadas (até LIMITE_RELATORIO_ERROS), ou None se não houve erro"""
+        if not self._erros:
+            return None
+        return pd.concat(self._erros, ignore_index=True).head(LIMITE_RELATORIO_ERROS)
+
+    def mensagem(self, registros):
+        """Resumo da leitura, dado o número de registros após somar as repetições"""
+        mensagem = f"{self.linhas_lidas} linhas lidas"
+        if self.linhas_descartadas:
+            mensagem += f", {self.linhas_descartadas} linhas com erro descartadas"
+        if registros < self.linhas_lidas - self.linhas_descartadas:
+            mensagem += f", linhas repetidas somadas em {registros} registros"
+        return mensagem
+
+def importar_planilha(conteudo, nome_arquivo, progresso=None, tamanho_bloco=TAMANHO_BLOCO_LEITURA,
+                      cancelamento=None):
+    """Lê, valida e normaliza uma planilha em blocos, com memória limitada.
+
+    Linhas com erro são descartadas e listadas no relatório; linhas repetidas
+    (mesma Região, Município, Hospital e Cargo) têm as vagas somadas.
+    `progresso(linhas_lidas, total_estimado)` é chamado após cada bloco e o
+    `cancelamento` interrompe a leitura (ver `LeituraPlanilha`).
+    Retorna (df, relatorio_erros, mensagem); df é None se a planilha não puder
+    ser usada.
+    """
+    leitura = LeituraPlanilha(conteudo, nome_arquivo, progresso, tamanho_bloco, cancelamento)
+    
+    # Agregação parcial: repetições dentro do bloco já saem somadas
+    parciais = [
+        validas.groupby(DIMENSOES, observed=True, sort=False)["Vagas"].sum().reset_index()
+        for validas in leitura.blocos_validos()
+    ]
+    if leitura.erro is not None:
+        return None, None, leitura.erro
+    
+    relatorio_erros = leitura.relatorio_erros()
+    agregado = (
+        pd.concat(parciais, ignore_index=True)
+        .groupby(DIMENSOES, observed=True, sort=False)["Vagas"].sum()
+        .reset_index()
+    )
+    if agregado.empty:
+        return None, relatorio_erros, "Nenhuma linha válida encontrada"
+    
+    return normalizar_dados(agregado[COLUNAS_ESPERADAS]), relatorio_erros, leitura.mensagem(len(agregado))
+
+
+# ---------- IMPORTAÇÃO EM SEGUNDO PLANO ----------
+class TarefaImportacao:
+    """Importação de uma planilha numa thread, com progresso e cancelamento.
+
+    `executar(progresso, cancelamento)` faz a leitura (por exemplo com
+    `importar_planilha`) e devolve o resultado, que fica em `resultado`. A
+    interface só consulta os atributos, sem esperar a thread: `concluida`,
+    `fracao()`, `linhas_lidas`, `cancelada` e `erro`.
+    """
+
+    def __init__(self, chave, nome_arquivo, executar):
+        self.chave = chave
+        self.nome_arquivo = nome_arquivo
+        self.linhas_lidas = 0
+        self.total_estimado = None
+        self.resultado = None
+        self.erro = None
+        self.cancelada = False
+        self._cancelamento = threading.Event()
+        self._thread = threading.Thread(
+            target=self._executar, args=(executar,), name=f"importacao-{chave[:12]}", daemon=True
+        )
+        self._thread.start()
+
+    def _executar(self, executar):
+        try:
+            self.resultado = executar(self._progresso, self._cancelamento)
+        except ImportacaoCancelada:
+            self.cancelada = True
+        except Exception as e:
+            self.erro = e
+
+    def _progresso(self, linhas_lidas, total_estimado):
+        self.linhas_lidas = linhas_lidas
+        self.total_estimado = total_estimado
+
+    @property
+    def concluida(self):
+        return not self._thread.is_alive()
+
+    def fracao(self):
+        """Parte já lida, entre 0 e 1 (estimada pelo total de linhas do arquivo)"""
+        if not self.total_estimado:
+            return 0.0
+        return min(self.linhas_lidas / self.total_estimado, 1.0)
+
+    def cancelar(self):
+        """Pede a interrupção; a thread para antes do próximo bloco"""
+        self._cancelamento.set()
+
+    def aguardar(self, segundos=None):
+        self._thread.join(segundos)
+        return self.concluida
+
+
+# ---------- REGISTRO DE CONJUNTOS DE DADOS ----------
+def calcular_hash_conteudo(conteudo):
+    """Gera a chave do cache a partir do conteúdo bruto do arquivo"""
+    return hashlib.sha256(conteudo).hexdigest()
+
+class TravasPorChave:
+    """Uma trava por chave, para que só uma thread crie cada item.
+
+    A trava de uma chave só é descartada quando ninguém mais a usa nem espera
+    por ela; assim quem chega depois de uma criação que falhou ou foi
+    cancelada espera na mesma trava de quem já estava na fila.
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._travas = {}
+
+    @contextmanager
+    def travar(self, chave):
+        with self._trava:
+            entrada = self._travas.setdefault(chave, [threading.Lock(), 0])
+            entrada[1] += 1
+        try:
+            with entrada[0]:
+                yield
+        finally:
+            with self._trava:
+                entrada[1] -= 1
+                if entrada[1] == 0:
+                    del self._travas[chave]
+
+class RegistroDados:
+    """Conjuntos de dados do processo, compartilhados por todas as sessões.
+
+    Cada conjunto é guardado uma única vez por chave (o hash do arquivo, no
+    caso das planilhas) e entregue às sessões como uma visão rasa, sem cópia
+    dos dados; com Copy-on-Write, uma alteração numa visão não chega às
+    outras. O índice dos filtros de cada conjunto fica junto com ele e entra
+    na mesma conta. Os menos usados recentemente são descartados (com o
+    índice) quando o total passa de `limite_bytes`. Se houver uma pasta
+    configurada, os conjuntos persistidos também são gravados em Parquet
+    (com as informações ao lado, em JSON e Parquet) e relidos de lá depois
+    de sair da memória.
+    """
+
+    def __init__(self, limite_bytes, diretorio_parquet=None):
+        self.limite_bytes = limite_bytes
+        self.diretorio_parquet = Path(diretorio_parquet) if diretorio_parquet else None
+        self.bytes_usados = 0
+        self.acertos = 0
+        self.falhas = 0
+        self.descartes = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+        self._travas_chaves = TravasPorChave()
+
+    def obter(self, chave):
+        """Visão do conjunto e informações guardadas com ele, ou (None, None)"""
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is not None:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return item[0].copy(deep=False), item[2]
+
+        df, info = self._ler_parquet(chave)
+        if df is None:
+            return None, None
+        with self._trava:
+            self.acertos += 1
+        return self._guardar_em_memoria(chave, df, info), info
+
+    def obter_ou_criar(self, chave, criar, persistir=True):
+        """Visão do conjunto da chave; se ainda não existe, guarda o de `criar()`.
+
+        `criar()` devolve `(df, info)`; com `df` None nada é guardado. Sessões
+        que pedem a mesma chave ao mesmo tempo esperam uma única criação.
+        """
+        df, info = self.obter(chave)
+        if df is not None:
+            return df, info
+
+        with self._travas_chaves.travar(chave):
+            # Outra sessão pode ter terminado a mesma criação enquanto esta esperava
+            df, info = self.obter(chave)
+            if df is not None:
+                return df, info
+
+            with self._trava:
+                self.falhas += 1
+            df, info = criar()
+            if df is not None:
+                if persistir:
+                    self._gravar_parquet(chave, df, info)
+                df = self._guardar_em_memoria(chave, df, info)
+            return df, info
+
+    def estatisticas(self):
+        """Números do registro para o painel de desempenho"""
+        with self._trava:
+            return {
+                "conjuntos": len(self._itens),
+                "bytes_usados": self.bytes_usados,
+                "limite_bytes": self.limite_bytes,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "descartes": self.descartes,
+            }
+
+    def _guardar_em_memoria(self, chave, df, info):
+        tamanho = tamanho_em_bytes(df)
+        with self._trava:
+            if chave in self._itens:
+                # Já guardado por outra sessão: usa o existente
+                self._itens.move_to_end(chave)
+                return self._itens[chave][0].copy(deep=False)
+
+            if tamanho > self.limite_bytes:
+                # Maior que o próprio limite: fica só com quem pediu (e no Parquet, se houver)
+                return df
+
+            # [df, bytes (com o índice), info, índice dos filtros]
+            self._itens[chave] = [df, tamanho, info, None]
+            self.bytes_usados += tamanho
+            self._descartar_excedente()
+        return df.copy(deep=False)
+
+    def indice_filtros(self, chave, df):
+        """Índice dos filtros do conjunto da chave, montado uma vez e contado no limite"""
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is not None and item[3] is not None:
+                return item[3]
+
+        indice = IndiceFiltros(df)
+        tamanho = indice.tamanho_em_bytes()
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is None:
+                # Conjunto fora do registro: o índice fica só com quem pediu
+                return indice
+            if item[3] is None:
+                item[3] = indice
+                item[1] += tamanho
+                self.bytes_usados += tamanho
+                self._itens.move_to_end(chave)
+                self._descartar_excedente()
+            return item[3]
+
+    def _descartar_excedente(self):
+        """Descarta os menos usados até caber no limite (o mais recente sempre fica)"""
+        while self.bytes_usados > self.limite_bytes and len(self._itens) > 1:
+            _, item = self._itens.popitem(last=False)
+            self.bytes_usados -= item[1]
+            self.descartes += 1
+
+    def _caminho_parquet(self, chave, parte=None):
+        sufixo = f".{parte}" if parte else ""
+        return self.diretorio_parquet / f"{chave}{sufixo}.parquet"
+
+    def _caminho_info(self, chave):
+        return self.diretorio_parquet / f"{chave}.json"
+
+    def _gravar_atomico(self, caminho, escrever):
+        """`escrever(temporario)` num arquivo de nome único, renomeado para `caminho` no fim"""
+        descritor, temporario = tempfile.mkstemp(suffix=".tmp", prefix=f"{caminho.stem}-", dir=caminho.parent)
+        os.close(descritor)
+        try:
+            escrever(temporario)
+            os.replace(temporario, caminho)
+        finally:
+            Path(temporario).unlink(missing_ok=True)
+
+    def _gravar_parquet(self, chave, df, info):
+        if self.diretorio_parquet is None:
+            return
+        caminho = self._caminho_parquet(chave)
+        if caminho.exists():
+            return
+        try:
+            self.diretorio_parquet.mkdir(parents=True, exist_ok=True)
+            # Tabelas das informações (o relatório de erros) em Parquet, o resto em JSON;
+            # o arquivo dos dados vai por último, quando as informações já estão gravadas
+            tabelas = {nome: valor for nome, valor in info.items() if isinstance(valor, pd.DataFrame)}
+            valores = {nome: valor for nome, valor in info.items() if nome not in tabelas}
+            for nome, tabela in tabelas.items():
+                self._gravar_atomico(
+                    self._caminho_parquet(chave, nome), lambda destino: tabela.to_parquet(destino, index=False)
+                )
+            conteudo = json.dumps({"valores": valores, "tabelas": list(tabelas)}, ensure_ascii=False)
+            self._gravar_atomico(self._caminho_info(chave), lambda destino: Path(destino).write_text(conteudo, encoding="utf-8"))
+            self._gravar_atomico(caminho, lambda destino: df.to_parquet(destino, index=False))
+        except (ImportError, OSError, TypeError):
+            # Sem pyarrow, sem permissão de escrita ou informação que não vai para JSON: segue só com a memória
+            self.diretorio_parquet = None
+
+    def _ler_parquet(self, chave):
+        """(df, info) gravados em Parquet, ou (None, None)"""
+        if self.diretorio_parquet is None:
+            return None, None
+        caminho = self._caminho_parquet(chave)
+        if not caminho.exists():
+            return None, None
+        try:
+            df = pd.read_parquet(caminho)
+            info = {}
+            caminho_info = self._caminho_info(chave)
+            if caminho_info.exists():
+                gravado = json.loads(caminho_info.read_text(encoding="utf-8"))
+                info = dict(gravado["valores"])
+                for nome in gravado["tabelas"]:
+                    info[nome] = pd.read_parquet(self._caminho_parquet(chave, nome))
+            return df, info
+        except (ImportError, OSError, ValueError, KeyError):
+            return None, None
+
+
+# ---------- HIERARQUIA DOS FILTROS ----------
+class HierarquiaFiltros:
+    """Opções dos filtros em cascata (Região → Município → Hospital) e lista de cargos.
+
+    Montada uma vez por conjunto de dados; as listas da barra lateral passam a ser
+    consultas em dicionário, já ordenadas.
+    """
+
+    def __init__(self, df):
+        combinacoes = (
+            df.groupby(["Região de Saúde", "Município", "Hospital"], observed=True)
+            .size()
+            .index.to_frame(index=False)
+        )
+        self.regioes = sorted(combinacoes["Região de Saúde"].unique())
+        self.todos_municipios = sorted(combinacoes["Município"].unique())
+        self.todos_hospitais = sorted(combinacoes["Hospital"].unique())
+        self.cargos = sorted(df["Cargo"].dropna().unique())
+        
+        self.municipios_por_regiao = self._agrupar(combinacoes, "Região de Saúde", "Município")
+        self.hospitais_por_regiao = self._agrupar(combinacoes, "Região de Saúde", "Hospital")
+        self.hospitais_por_municipio = self._agrupar(combinacoes, "Município", "Hospital")
+
+    @staticmethod
+    def _agrupar(combinacoes, pai, filho):
+        return {
+            valor: sorted(grupo[filho].unique())
+            for valor, grupo in combinacoes.groupby(pai, observed=True)
+        }
+
+    @staticmethod
+    def _unir(opcoes_por_valor, selecionados):
+        if len(selecionados) == 1:
+            return opcoes_por_valor.get(selecionados[0], [])
+        return sorted({opcao for valor in selecionados for opcao in opcoes_por_valor.get(valor, [])})
+
+    def municipios(self, regioes):
+        """Municípios das regiões selecionadas (todos, se nenhuma)"""
+        if not regioes:
+            return self.todos_municipios
+        return self._unir(self.municipios_por_regiao, regioes)
+
+    def hospitais(self, regioes, municipios):
+        """Hospitais dos municípios selecionados, ou das regiões se não houver município"""
+        if municipios:
+            return self._unir(self.hospitais_por_municipio, municipios)
+        if regioes:
+            return self._unir(self.hospitais_por_regiao, regioes)
+        return self.todos_hospitais
+
+
+# ---------- ÍNDICE DOS FILTROS ----------
+class IndiceFiltros:
+    """Posições das linhas de cada valor de Região, Município, Hospital e Cargo.
+
+    Montado uma vez por conjunto de dados a partir dos códigos das categorias.
+    Aplicar os filtros passa a ser uma interseção de listas ordenadas de
+    posições, sem varrer as colunas de texto.
+    """
+
+    def __init__(self, df):
+        tipo_posicao = np.int32 if len(df) < 2**31 else np.int64
+        self.total_linhas = len(df)
+        self.codigos = {}
+        self.codigo_do_valor = {}
+        self.linhas = {}
+        for col in DIMENSOES:
+            codigos = df[col].cat.codes.to_numpy()
+            self.codigos[col] = codigos
+            # Posições agrupadas por código, em ordem crescente dentro de cada grupo
+            ordem = np.argsort(codigos, kind="stable").astype(tipo_posicao)
+            categorias = df[col].cat.categories
+            self.codigo_do_valor[col] = {categoria: i for i, categoria in enumerate(categorias)}
+            limites = np.searchsorted(codigos[ordem], np.arange(len(categorias) + 1))
+            self.linhas[col] = {
+                categoria: ordem[limites[i]:limites[i + 1]]
+                for i, categoria in enumerate(categorias)
+            }
+
+    def tamanho_em_bytes(self):
+        """Memória das posições e dos dicionários (os códigos são do próprio DataFrame)"""
+        total = 0
+        for col in DIMENSOES:
+            total += sys.getsizeof(self.linhas[col]) + sys.getsizeof(self.codigo_do_valor[col])
+            total += sum(sys.getsizeof(posicoes) + posicoes.nbytes for posicoes in self.linhas[col].values())
+        return total
+
+    def linhas_da_dimensao(self, col, valores):
+        """Posições (ordenadas) das linhas com qualquer um dos valores da dimensão"""
+        listas = [self.linhas[col][valor] for valor in valores if valor in self.linhas[col]]
+        if not listas:
+            return np.empty(0, dtype=np.int32)
+        if len(listas) == 1:
+            return listas[0]
+
+        total = sum(len(lista) for lista in listas)
+        if total * 8 < self.total_linhas:
+            # Poucas linhas: juntar as listas (disjuntas) e ordenar
+            return np.sort(np.concatenate(listas))
+
+        # Muitas linhas: tabela de consulta sobre os códigos da categoria
+        selecionados = np.zeros(len(self.linhas[col]) + 1, dtype=bool)
+        selecionados[[self.codigo_do_valor[col][valor] for valor in valores if valor in self.linhas[col]]] = True
+        # Código -1 (valor vazio) cai na última posição, que fica como False
+        return np.flatnonzero(selecionados[self.codigos[col]]).astype(listas[0].dtype)
+
+    def linhas_filtradas(self, filtros):
+        """Posições que atendem a todos os filtros ({coluna: [valores]}); None se não há filtro"""
+        if not filtros:
+            return None
+        
+        listas = sorted(
+            (self.linhas_da_dimensao(col, valores) for col, valores in filtros.items()),
+            key=len
+        )
+        # Começa pela menor lista e busca cada posição nas demais
+        resultado = listas[0]
+        for outra in listas[1:]:
+            if len(resultado) == 0 or len(outra) == 0:
+                return resultado[:0]
+            pos = np.minimum(np.searchsorted(outra, resultado), len(outra) - 1)
+            resultado = resultado[outra[pos] == resultado]
+        return resultado
+
+    def aplicar(self, df, filtros):
+        """Linhas filtradas do DataFrame; sem filtros ativos devolve o próprio df, sem cópia"""
+        linhas = self.linhas_filtradas(filtros)
+        if linhas is None:
+            return df
+        return df.iloc[linhas]
+
+
+# ---------- CUBO DE AGREGAÇÃO ----------
+def unir_categorias(frames, colunas):
+    """Mesmas categorias (a união, em ordem alfabética) nas colunas de todos os DataFrames"""
+    frames = list(frames)
+    for coluna in colunas:
+        if not all(isinstance(f[coluna].dtype, pd.CategoricalDtype) for f in frames):
+            continue
+        categorias = frames[0][coluna].cat.categories
+        for f in frames[1:]:
+            if not f[coluna].cat.categories.equals(categorias):
+                categorias = categorias.union(f[coluna].cat.categories)
+        frames = [
+            f if f[coluna].cat.categories.equals(categorias)
+            else f.assign(**{coluna: f[coluna].cat.set_categories(categorias)})
+            for f in frames
+        ]
+    return frames
+
+def nome_outros(nomes):
+    """Rótulo da categoria que soma as que ficaram fora do top k"""
+    return "Outros" if "Outros" not in nomes else "Outros (demais)"
+
+class CuboAgregacao:
+    """Somas de vagas de um estado de filtros, calculadas uma única vez.
+
+    A base é um único groupby em (Região, Município, Hospital, Cargo). Todas as
+    marginais e combinações usadas nos gráficos e estatísticas são derivadas
+    dela, que costuma ser muito menor que os dados originais.
+    """
+
+    def __init__(self, df):
+        self.base = self._agregar(df)
+        self._somas = {}
+        self._linhas = {}
+        self._codigos = {}
+        self._totais = {}
+
+    @staticmethod
+    def _agregar(df):
+        return (
+            df.groupby(DIMENSOES, observed=True)["Vagas"]
+            .agg(Vagas="sum", Minimo="min", Maximo="max")
+            .reset_index()
+        )
+
+    @staticmethod
+    def _ordenar_somas(somas):
+        """Do maior para o menor total; empates pela ordem das categorias"""
+        return somas.sort_values("Vagas", ascending=False, kind="stable", ignore_index=True)
+
+    def soma_por(self, *dimensoes):
+        """Total de vagas agrupado pelas dimensões pedidas, do maior para o menor"""
+        if dimensoes not in self._somas:
+            somas = self._ordenar_somas(
+                self.base.groupby(list(dimensoes), observed=True)["Vagas"]
+                .agg(Vagas="sum", Linhas="size")
+                .reset_index()
+            )
+            # Quantas linhas da base formam cada grupo (usado em `com_delta`)
+            self._linhas[dimensoes] = somas.pop("Linhas")
+            self._somas[dimensoes] = somas
+        return self._somas[dimensoes]
+
+    def com_delta(self, removidas, incluidas):
+        """Novo cubo com as linhas `removidas` trocadas pelas `incluidas`.
+
+        Usado quando chega uma nova versão dos dados: a base é atualizada e as
+        somas já calculadas são corrigidas só com os grupos das linhas
+        alteradas, sem refazer os agrupamentos sobre todos os dados.
+        `removidas` precisa conter linhas inteiras da base atual.
+        """
+        removidas = self._agregar(removidas)
+        incluidas = self._agregar(incluidas)
+        base, removidas, incluidas = unir_categorias([self.base, removidas, incluidas], DIMENSOES)
+
+        # Só as linhas da base com um hospital das removidas são comparadas pela chave inteira
+        manter = np.ones(len(base), dtype=bool)
+        candidatas = np.flatnonzero(base["Hospital"].isin(removidas["Hospital"].unique()).to_numpy())
+        chaves = pd.MultiIndex.from_frame(base[DIMENSOES].iloc[candidatas])
+        manter[candidatas[chaves.isin(pd.MultiIndex.from_frame(removidas[DIMENSOES]))]] = False
+        novo = CuboAgregacao.__new__(CuboAgregacao)
+        novo.base = pd.concat([base[manter], incluidas], ignore_index=True)
+        novo._somas, novo._linhas, novo._codigos, novo._totais = {}, {}, {}, {}
+        if not all(isinstance(base[d].dtype, pd.CategoricalDtype) for d in DIMENSOES):
+            # Sem categorias não há códigos: as somas são refeitas sob demanda
+            return novo
+
+        for dimensoes, somas in self._somas.items():
+            # Cada grupo vira um código inteiro (posição no produto das categorias),
+            # como nos outros métodos do cubo, e as correções são um único bincount
+            tipos = [novo.base[d].dtype for d in dimensoes]
+            tamanhos = [len(t.categories) for t in tipos]
+            partes = [
+                (somas, somas["Vagas"].to_numpy(np.int64), self._linhas[dimensoes].to_numpy(np.int64)),
+                (removidas, -removidas["Vagas"].to_numpy(np.int64), np.full(len(removidas), -1, dtype=np.int64)),
+                (incluidas, incluidas["Vagas"].to_numpy(np.int64), np.ones(len(incluidas), dtype=np.int64)),
+            ]
+            grupos = np.concatenate([
+                np.ravel_multi_index([self._codigos_no_tipo(df[d], t) for d, t in zip(dimensoes, tipos)], tamanhos)
+                for df, _, _ in partes
+            ])
+            grupos, posicoes = np.unique(grupos, return_inverse=True)
+            vagas = np.bincount(posicoes, weights=np.concatenate([p[1] for p in partes]), minlength=len(grupos))
+            linhas = np.bincount(posicoes, weights=np.concatenate([p[2] for p in partes]), minlength=len(grupos))
+
+            # Grupos que ficaram sem nenhuma linha somem, como num agrupamento novo
+            restantes = linhas > 0
+            codigos = np.unravel_index(grupos[restantes], tamanhos)
+            corrigidas = pd.DataFrame({
+                **{d: pd.Categorical.from_codes(c, dtype=t) for d, c, t in zip(dimensoes, codigos, tipos)},
+                "Vagas": vagas[restantes].astype(np.int64).astype(somas["Vagas"].dtype),
+                "Linhas": linhas[restantes].astype(np.int64),
+            })
+            corrigidas = self._ordenar_somas(corrigidas)
+            novo._linhas[dimensoes] = corrigidas.pop("Linhas")
+            novo._somas[dimensoes] = corrigidas
+        return novo
+
+    @staticmethod
+    def _codigos_no_tipo(coluna, tipo):
+        """Códigos da coluna categórica nas categorias de `tipo`"""
+        if not coluna.cat.categories.equals(tipo.categories):
+            coluna = coluna.cat.set_categories(tipo.categories)
+        return coluna.cat.codes.to_numpy()
+
+    def maiores(self, dimensao, k, outros=True):
+        """As k categorias com mais vagas, do maior para o menor.
+
+        Com `outros`, as demais categorias são somadas numa linha "Outros". O
+        resultado é igual a `soma_por(dimensao).head(k)`, mas sem agrupar nem
+        ordenar todas as categorias.
+        """
+        _, categorias = self._codigos_da_dimensao(dimensao)
+        totais, presentes = self._totais_da_dimensao(dimensao)
+        escolhidos = self._top_codigos(dimensao, k)
+        nomes = list(categorias[escolhidos])
+        vagas = list(totais[escolhidos])
+
+        if outros and len(escolhidos) < len(presentes):
+            nomes.append(nome_outros(nomes))
+            vagas.append(totais.sum() - sum(vagas))
+
+        return pd.DataFrame({
+            dimensao: pd.Categorical(nomes, categories=nomes),
+            "Vagas": np.array(vagas, dtype=np.int64),
+        })
+
+    def maiores_cruzado(self, linhas, colunas, k_linhas=None, k_colunas=None,
+                        outros_linhas=False, outros_colunas=False):
+        """Vagas por par (linhas, colunas) só com as k maiores categorias de cada dimensão.
+
+        `None` em k mantém todas as categorias. As categorias fora do top k são
+        descartadas ou, com `outros_*`, somadas em "Outros". As duas dimensões
+        voltam como categóricas, com as categorias do maior para o menor total
+        (e "Outros" por último); as linhas saem nessa mesma ordem.
+        """
+        faixa_l, nomes_l = self._faixas(linhas, k_linhas, outros_linhas)
+        faixa_c, nomes_c = self._faixas(colunas, k_colunas, outros_colunas)
+
+        # Uma única contagem sobre o par de faixas (linhas fora do top k ficam com -1)
+        validas = (faixa_l >= 0) & (faixa_c >= 0)
+        par = faixa_l[validas] * len(nomes_c) + faixa_c[validas]
+        tamanho = len(nomes_l) * len(nomes_c)
+        somas = np.bincount(par, weights=self.base["Vagas"].to_numpy()[validas], minlength=tamanho)
+        presentes = np.flatnonzero(np.bincount(par, minlength=tamanho))
+
+        return pd.DataFrame({
+            linhas: pd.Categorical.from_codes(presentes // len(nomes_c), nomes_l),
+            colunas: pd.Categorical.from_codes(presentes % len(nomes_c), nomes_c),
+            "Vagas": somas[presentes].astype(np.int64),
+        })
+
+    def _codigos_da_dimensao(self, dimensao):
+        """Códigos inteiros e categorias de uma dimensão da base"""
+        if dimensao not in self._codigos:
+            coluna = self.base[dimensao]
+            if isinstance(coluna.dtype, pd.CategoricalDtype):
+                codigos, categorias = coluna.cat.codes.to_numpy(), coluna.cat.categories
+            else:
+                codigos, categorias = pd.factorize(coluna, sort=True)
+            self._codigos[dimensao] = (codigos, pd.Index(categorias))
+        return self._codigos[dimensao]
+
+    def _totais_da_dimensao(self, dimensao):
+        """Vagas por código da dimensão e códigos presentes na base"""
+        if dimensao not in self._totais:
+            codigos, categorias = self._codigos_da_dimensao(dimensao)
+            totais = np.bincount(codigos, weights=self.base["Vagas"].to_numpy(), minlength=len(categorias))
+            presentes = np.flatnonzero(np.bincount(codigos, minlength=len(categorias)))
+            self._totais[dimensao] = (totais, presentes)
+        return self._totais[dimensao]
+
+    def _top_codigos(self, dimensao, k):
+        """Códigos das k categorias com mais vagas, do maior para o menor.
+
+        Empates seguem a ordem das categorias, como em `soma_por`. Só as k
+        primeiras são ordenadas; as demais passam apenas por um `partition`.
+        """
+        totais, presentes = self._totais_da_dimensao(dimensao)
+        if k is not None and k < len(presentes):
+            totais_presentes = totais[presentes]
+            limiar = np.partition(totais_presentes, len(presentes) - k)[len(presentes) - k]
+            acima = presentes[totais_presentes > limiar]
+            empatados = presentes[totais_presentes == limiar][:k - len(acima)]
+            presentes = np.concatenate([acima, empatados])
+        return presentes[np.lexsort((presentes, -totais[presentes]))]
+
+    def _faixas(self, dimensao, k, outros):
+        """Posição de cada linha da base no top k (-1 fora dele) e nomes das posições"""
+        codigos, categorias = self._codigos_da_dimensao(dimensao)
+        escolhidos = self._top_codigos(dimensao, k)
+        nomes = list(categorias[escolhidos])
+
+        # Quem fica fora do top k vai para "Outros" (se pedido e se houver) ou é descartado
+        restantes = len(self._totais_da_dimensao(dimensao)[1]) - len(escolhidos)
+        posicao_fora = -1
+        if outros and restantes > 0:
+            posicao_fora = len(nomes)
+            nomes.append(nome_outros(nomes))
+
+        mapa = np.full(len(categorias), posicao_fora, dtype=np.intp)
+        mapa[escolhidos] = np.arange(len(escolhidos))
+        return mapa[codigos], nomes
+
+    def total_vagas(self):
+        return self.base["Vagas"].sum()
+
+    def distintos(self, dimensao):
+        """Quantidade de valores distintos de uma dimensão"""
+        return self.base[dimensao].nunique()
+
+    def minimo(self):
+        return self.base["Minimo"].min()
+
+    def maximo(self):
+        return self.base["Maximo"].max()
+
+
+# ---------- RESUMO ESTATÍSTICO ----------
+# Municípios e cargos listados como os de mais vagas
+TOP_RESUMO = 5
+
+def resumo_estatistico(cubo):
+    """Métricas e "Análise Estatística" de um cubo (CuboAgregacao ou CuboBanco).
+
+    Único cálculo desses números, usado pelo app.py, pelos relatórios HTML e
+    pelo benchmark.
+    """
+    por_municipio = cubo.soma_por("Município")
+    return {
+        "total_vagas": cubo.total_vagas(),
+        "hospitais": cubo.distintos("Hospital"),
+        "municipios": cubo.distintos("Município"),
+        "cargos": cubo.distintos("Cargo"),
+        "top_municipios": por_municipio.head(TOP_RESUMO),
+        "top_cargos": cubo.soma_por("Cargo").head(TOP_RESUMO),
+        "media": por_municipio["Vagas"].mean(),
+        "mediana": por_municipio["Vagas"].median(),
+        "minimo": cubo.minimo(),
+        "maximo": cubo.maximo(),
+    }
+
+
+# ---------- VERSÕES DO CONJUNTO DE DADOS ----------
+# Chave que identifica uma linha entre versões da planilha (retificações do edital)
+CHAVE_VERSOES = ["Município", "Hospital", "Cargo"]
+
+class DiferencaVersoes:
+    """Mudanças entre duas versões dos dados, comparando pela chave (Município, Hospital, Cargo).
+
+    `removidas` e `incluidas` são as linhas das chaves que mudaram (vagas ou
+    região), na versão anterior e na nova; com elas o cubo da versão anterior
+    é atualizado por `CuboAgregacao.com_delta`.
+    """
+
+    def __init__(self, anterior, nova):
+        anterior, nova = unir_categorias([anterior[COLUNAS_ESPERADAS], nova[COLUNAS_ESPERADAS]], DIMENSOES)
+        por_chave = [
+            df.groupby(CHAVE_VERSOES, observed=True)
+            .agg(**{"Região de Saúde": ("Região de Saúde", "first"), "Vagas": ("Vagas", "sum")})
+            for df in (anterior, nova)
+        ]
+        comparacao = por_chave[0].join(por_chave[1], how="outer", lsuffix=" anteriores", rsuffix=" novas")
+
+        vagas_anteriores = comparacao["Vagas anteriores"].fillna(0).astype(np.int64)
+        vagas_novas = comparacao["Vagas novas"].fillna(0).astype(np.int64)
+        incluida = comparacao["Vagas anteriores"].isna()
+        removida = comparacao["Vagas novas"].isna()
+        mudou_regiao = (
+            comparacao["Região de Saúde anteriores"].astype(object)
+            != comparacao["Região de Saúde novas"].astype(object)
+        ) & ~incluida & ~removida
+        alterada = incluida | removida | mudou_regiao | (vagas_anteriores != vagas_novas)
+
+        mudancas = comparacao[alterada]
+        self.mudancas = pd.DataFrame({
+            "Região de Saúde": mudancas["Região de Saúde novas"].fillna(mudancas["Região de Saúde anteriores"]),
+            "Vagas anteriores": vagas_anteriores[alterada],
+            "Vagas novas": vagas_novas[alterada],
+            "Diferença": (vagas_novas - vagas_anteriores)[alterada],
+            "Situação": np.select(
+                [incluida[alterada], removida[alterada]], ["Incluída", "Removida"], "Alterada"
+            ),
+        }).reset_index()[["Região de Saúde"] + CHAVE_VERSOES + ["Vagas anteriores", "Vagas novas", "Diferença", "Situação"]]
+
+        chaves_alteradas = mudancas.index
+        self.removidas = anterior[pd.MultiIndex.from_frame(anterior[CHAVE_VERSOES]).isin(chaves_alteradas)]
+        self.incluidas = nova[pd.MultiIndex.from_frame(nova[CHAVE_VERSOES]).isin(chaves_alteradas)]
+
+    @staticmethod
+    def _filtrar(df, filtros):
+        mascara = np.ones(len(df), dtype=bool)
+        for coluna, valores in filtros.items():
+            mascara &= df[coluna].isin(valores).to_numpy()
+        return df[mascara]
+
+    def linhas_alteradas(self, filtros):
+        """(removidas, incluidas) dentro dos filtros, para `CuboAgregacao.com_delta`"""
+        return self._filtrar(self.removidas, filtros), self._filtrar(self.incluidas, filtros)
+
+    def alteracoes(self, filtros):
+        """Chaves alteradas dentro dos filtros, da maior variação absoluta para a menor"""
+        mudancas = self._filtrar(self.mudancas, filtros)
+        ordem = np.argsort(-mudancas["Diferença"].abs().to_numpy(), kind="stable")
+        return mudancas.iloc[ordem].reset_index(drop=True)
+
+    def por(self, dimensao, filtros):
+        """Vagas anteriores, novas e diferença por valor da dimensão, só nas chaves alteradas"""
+        removidas, incluidas = self.linhas_alteradas(filtros)
+        comparacao = pd.concat([
+            removidas.groupby(dimensao, observed=True)["Vagas"].sum().rename("Vagas anteriores"),
+            incluidas.groupby(dimensao, observed=True)["Vagas"].sum().rename("Vagas novas"),
+        ], axis=1).fillna(0).astype(np.int64)
+        comparacao["Diferença"] = comparacao["Vagas novas"] - comparacao["Vagas anteriores"]
+        comparacao = comparacao.reset_index()
+        ordem = np.argsort(-comparacao["Diferença"].abs().to_numpy(), kind="stable")
+        return comparacao.iloc[ordem].reset_index(drop=True)
+
+    def resumo(self, filtros):
+        """Quantidade de chaves incluídas, removidas e alteradas, e o saldo de vagas"""
+        mudancas = self._filtrar(self.mudancas, filtros)
+        situacoes = mudancas["Situação"].value_counts()
+        return {
+            "Incluída": int(situacoes.get("Incluída", 0)),
+            "Removida": int(situacoes.get("Removida", 0)),
+            "Alterada": int(situacoes.get("Alterada", 0)),
+            "saldo": int(mudancas["Diferença"].sum()),
+        }
+
+
+# ---------- ORDENAÇÃO DA TABELA ----------
+def posicoes_ordenadas(df, coluna, crescente=True):
+    """Ordem das linhas do DataFrame pela coluna (categorias pela ordem alfabética)"""
+    serie = df[coluna]
+    valores = serie.cat.codes.to_numpy() if isinstance(serie.dtype, pd.CategoricalDtype) else serie.to_numpy()
+    ordem = np.argsort(valores, kind="stable")
+    return ordem if crescente else ordem[::-1]
+
+
+# ---------- EXPORTAÇÃO DOS DADOS ----------
+# Linhas gravadas por vez ao exportar
+TAMANHO_BLOCO_EXPORTACAO = 100_000
+
+# Limite de linhas de uma planilha do Excel (sem contar o cabeçalho)
+LIMITE_LINHAS_XLSX = 1_048_575
+
+# Formato -> (extensão, tipo MIME)
+FORMATOS_EXPORTACAO = {
+    "CSV": ("csv", "text/csv"),
+    "CSV compactado (.gz)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Excel (.xlsx)": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+def blocos_de_linhas(df, tamanho=TAMANHO_BLOCO_EXPORTACAO):
+    """Percorre os dados em fatias de `tamanho` linhas (ao menos uma, mesmo vazia).
+
+    Aceita um DataFrame ou uma consulta com o método `blocos(tamanho)`, como a
+    do armazenamento em SQLite.
+    """
+    if hasattr(df, "blocos"):
+        yield from df.blocos(tamanho)
+        return
+    for inicio in range(0, max(len(df), 1), tamanho):
+        yield df.iloc[inicio:inicio + tamanho]
+
+def exportar_csv(df, destino):
+    for i, bloco in enumerate(blocos_de_linhas(df)):
+        destino.write(bloco.to_csv(index=False, header=(i == 0)).encode('utf-8'))
+
+def exportar_parquet(df, destino):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("A exportação em Parquet requer o pacote pyarrow") from None
+    
+    escritor = None
+    try:
+        for bloco in blocos_de_linhas(df):
+            if escritor is None:
+                esquema = pa.Schema.from_pandas(bloco.iloc[:0], preserve_index=False)
+                escritor = pq.ParquetWriter(destino, esquema, compression="zstd")
+            escritor.write_table(pa.Table.from_pandas(bloco, schema=esquema, preserve_index=False))
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+def exportar_xlsx(df, destino):
+    from openpyxl import Workbook
+    
+    if len(df) > LIMITE_LINHAS_XLSX:
+        raise ValueError(f"O Excel aceita no máximo {LIMITE_LINHAS_XLSX} linhas; use CSV ou Parquet")
+    
+    # Modo write_only: as linhas vão direto para o arquivo, sem montar a planilha em memória
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet("Vagas")
+    aba.append(list(df.columns))
+    for bloco in blocos_de_linhas(df):
+        bloco = bloco.astype(object).where(bloco.notna(), None)
+        for linha in bloco.itertuples(index=False, name=None):
+            aba.append(linha)
+    planilha.save(destino)
+
+def exportar_dados(df, formato, destino):
+    """Grava os dados no arquivo binário `destino`, em blocos, no formato escolhido"""
+    if formato == "CSV":
+        exportar_csv(df, destino)
+    elif formato == "CSV compactado (.gz)":
+        with gzip.GzipFile(fileobj=destino, mode="wb") as compactado:
+            exportar_csv(df, compactado)
+    elif formato == "Parquet":
+        exportar_parquet(df, destino)
+    elif formato == "Excel (.xlsx)":
+        exportar_xlsx(df, destino)
+    else:
+        raise ValueError(f"Formato de exportação desconhecido: {formato}")
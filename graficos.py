@@ -0,0 +1,245 @@
+"""Construção das figuras Plotly a partir do cubo de agregação, e cache das figuras."""
+from collections import OrderedDict
+import threading
+
+import plotly.express as px
+import plotly.io as pio
+
+# Máximo de barras por gráfico; as demais categorias viram "Outros"
+MAX_BARRAS = 40
+
+# Cargos mostrados no mapa de calor e nas barras empilhadas
+MAX_CARGOS = 10
+
+# Municípios mostrados nas barras empilhadas
+MAX_MUNICIPIOS_EMPILHADAS = 8
+
+# ---------- CONSTRUÇÃO DOS GRÁFICOS ----------
+def figura_barras(cubo, agrupar_por):
+    """Gráfico de barras com o total de vagas por dimensão (até MAX_BARRAS + Outros)"""
+    df_group = cubo.maiores(agrupar_por, MAX_BARRAS)
+    titulo = f"Total de Vagas por {agrupar_por}"
+    if cubo.distintos(agrupar_por) > MAX_BARRAS:
+        titulo += f" (Top {MAX_BARRAS} + Outros)"
+    
+    fig = px.bar(
+        df_group, 
+        x=agrupar_por, 
+        y="Vagas",
+        title=titulo,
+        text="Vagas",
+        color_discrete_sequence=["#1f77b4"]
+    )
+    
+    fig.update_traces(
+        textposition="outside",
+        textfont_size=11,
+        cliponaxis=False,
+        marker_line_width=0,
+        opacity=0.8
+    )
+    
+    altura = 500 + max(0, (len(df_group) - 10) * 15)
+    fig.update_layout(
+        xaxis_title="",
+        yaxis_title="Número de Vagas",
+        xaxis_tickangle=-45 if len(df_group) > 5 else 0,
+        height=altura,
+        margin=dict(l=80, r=80, t=100, b=150),
+        showlegend=False,
+        yaxis=dict(range=[0, df_group["Vagas"].max() * 1.15])
+    )
+    return fig
+
+def figura_mapa_calor(cubo):
+    """Mapa de calor Região x Cargo (top 10 cargos); None se não houver dados"""
+    # Só os pares com os cargos do top entram na tabela pivô
+    pares = cubo.maiores_cruzado('Região de Saúde', 'Cargo', k_colunas=MAX_CARGOS)
+    if pares.empty:
+        return None
+    
+    heatmap_data_top = pares.pivot(
+        index='Região de Saúde', 
+        columns='Cargo', 
+        values='Vagas'
+    ).fillna(0)
+    heatmap_data_top.index = heatmap_data_top.index.astype(str)
+    heatmap_data_top.columns = heatmap_data_top.columns.astype(str)
+    
+    fig_heatmap = px.imshow(
+        heatmap_data_top,
+        text_auto=True,
+        aspect="auto",
+        color_continuous_scale='Blues',
+        title="Distribuição de Vagas por Região de Saúde e Cargo (Top 10 Cargos)",
+        labels=dict(x="Cargo", y="Região de Saúde", color="Vagas")
+    )
+    fig_heatmap.update_layout(
+        height=500,
+        xaxis_tickangle=-45,
+        margin=dict(l=150, r=50, t=100, b=150)
+    )
+    return fig_heatmap
+
+def figura_pizza_regiao(cubo):
+    """Rosca com a distribuição por Região de Saúde; None se não houver dados"""
+    df_regiao = cubo.soma_por("Região de Saúde")
+    if df_regiao.empty:
+        return None
+    
+    fig_pizza_regiao = px.pie(
+        df_regiao,
+        values='Vagas',
+        names='Região de Saúde',
+        title='Distribuição por Região de Saúde',
+        hole=0.3,
+        color_discrete_sequence=px.colors.qualitative.Set3
+    )
+    fig_pizza_regiao.update_traces(textposition='inside', textinfo='percent+label')
+    fig_pizza_regiao.update_layout(height=400)
+    return fig_pizza_regiao
+
+def figura_pizza_cargo(cubo):
+    """Rosca com os 8 cargos com mais vagas + Outros; None se não houver dados"""
+    df_cargo = cubo.maiores("Cargo", 8)
+    
+    if df_cargo.empty:
+        return None
+    
+    fig_pizza_cargo = px.pie(
+        df_cargo,
+        values='Vagas',
+        names='Cargo',
+        title='Distribuição por Cargo (Top 8 + Outros)',
+        hole=0.3,
+        color_discrete_sequence=px.colors.qualitative.Pastel
+    )
+    fig_pizza_cargo.update_traces(textposition='inside', textinfo='percent+label', textfont_size=10)
+    fig_pizza_cargo.update_layout(height=400)
+    return fig_pizza_cargo
+
+def figura_barras_empilhadas(cubo):
+    """Composição de cargos (top 10 + Outros) nos 8 municípios com mais vagas; None se não houver dados"""
+    # Só os pares dos municípios do top são agregados
+    df_stack_top = cubo.maiores_cruzado(
+        "Município", "Cargo",
+        k_linhas=MAX_MUNICIPIOS_EMPILHADAS, k_colunas=MAX_CARGOS, outros_colunas=True
+    )
+    
+    if df_stack_top.empty:
+        return None
+    
+    fig_stack = px.bar(
+        df_stack_top,
+        x="Município",
+        y="Vagas",
+        color="Cargo",
+        title="Composição de Cargos nos Principais Municípios",
+        text_auto=True,
+        barmode="stack",
+        category_orders={
+            "Município": list(df_stack_top["Município"].cat.categories),
+            "Cargo": list(df_stack_top["Cargo"].cat.categories),
+        },
+        color_discrete_sequence=px.colors.qualitative.Bold
+    )
+    fig_stack.update_layout(
+        height=500,
+        xaxis_tickangle=-45,
+        yaxis_title="Número de Vagas",
+        margin=dict(l=50, r=50, t=100, b=150),
+        legend=dict(orientation="h", yanchor="bottom", y=-0.5, xanchor="center", x=0.5)
+    )
+    fig_stack.update_traces(textfont_size=10, textposition="inside")
+    return fig_stack
+
+def figura_treemap(cubo):
+    """Treemap Região > Município; None se não houver dados"""
+    df_treemap = cubo.soma_por("Região de Saúde", "Município")
+    if df_treemap.empty:
+        return None
+    
+    fig_treemap = px.treemap(
+        df_treemap,
+        path=["Região de Saúde", "Município"],
+        values="Vagas",
+        title="Distribuição Hierárquica de Vagas: Região de Saúde > Município",
+        color="Vagas",
+        color_continuous_scale="Blues",
+        hover_data={"Vagas": True}
+    )
+    fig_treemap.update_layout(height=600, margin=dict(l=25, r=25, t=50, b=25))
+    fig_treemap.update_traces(
+        textinfo="label+value+percent parent",
+        textfont_size=12
+    )
+    return fig_treemap
+
+def figura_diferencas(por_dimensao, dimensao):
+    """Barras com a variação de vagas por dimensão entre duas versões (até MAX_BARRAS); None se não houver mudanças"""
+    df_dif = por_dimensao.head(MAX_BARRAS)
+    if df_dif.empty:
+        return None
+
+    df_dif = df_dif.assign(**{
+        dimensao: df_dif[dimensao].astype(str),
+        "Sentido": ["Aumento" if d > 0 else "Redução" if d < 0 else "Sem variação" for d in df_dif["Diferença"]],
+    })
+    fig_dif = px.bar(
+        df_dif,
+        x=dimensao,
+        y="Diferença",
+        color="Sentido",
+        text="Diferença",
+        title=f"Variação de Vagas por {dimensao} em relação à versão anterior",
+        color_discrete_map={"Aumento": "#2ca02c", "Redução": "#d62728", "Sem variação": "#7f7f7f"},
+        hover_data={"Vagas anteriores": True, "Vagas novas": True, "Sentido": False}
+    )
+    fig_dif.update_traces(textposition="outside", cliponaxis=False, marker_line_width=0)
+    fig_dif.update_layout(
+        xaxis_title="",
+        yaxis_title="Diferença de Vagas",
+        xaxis_tickangle=-45 if len(df_dif) > 5 else 0,
+        xaxis=dict(categoryorder="array", categoryarray=df_dif[dimensao].tolist()),
+        height=500,
+        margin=dict(l=80, r=80, t=100, b=150),
+        legend_title_text=""
+    )
+    return fig_dif
+
+
+# ---------- CACHE DE GRÁFICOS ----------
+class CacheFiguras:
+    """Figuras já montadas, serializadas em JSON.
+
+    A chave combina conjunto de dados, filtros, tipo de gráfico e opções. As
+    menos usadas recentemente saem quando o total passa de `max_itens`.
+    """
+
+    def __init__(self, max_itens):
+        self.max_itens = max_itens
+        self.acertos = 0
+        self.falhas = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave, construir):
+        """Figura da chave; chama `construir()` só quando ainda não está no cache"""
+        with self._trava:
+            encontrada = chave in self._itens
+            if encontrada:
+                self._itens.move_to_end(chave)
+                serializada = self._itens[chave]
+                self.acertos += 1
+            else:
+                self.falhas += 1
+        
+        if encontrada:
+            return None if serializada is None else pio.from_json(serializada)
+        
+        fig = construir()
+        with self._trava:
+            self._itens[chave] = None if fig is None else fig.to_json()
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+        return fig
@@ -0,0 +1,100 @@
+"""Medição de tempo das etapas do painel (sem dependência do Streamlit)."""
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# Quantidade de medições recentes guardadas por etapa para os percentis
+JANELA_PERCENTIS = 1000
+
+PERCENTIS = (50, 90, 99)
+
+
+# ---------- REGISTRO DO PROCESSO ----------
+class RegistroTempos:
+    """Tempos das etapas de todas as sessões, para os percentis do painel.
+
+    Cada etapa guarda só as últimas `janela` medições. Se houver um arquivo de
+    log configurado, cada medição também é anexada a ele como uma linha JSON.
+    """
+
+    def __init__(self, janela=JANELA_PERCENTIS, caminho_log=None):
+        self.janela = janela
+        self.caminho_log = caminho_log
+        self._tempos = {}
+        self._trava = threading.Lock()
+
+    def registrar(self, sessao, execucao, etapa, segundos):
+        with self._trava:
+            if etapa not in self._tempos:
+                self._tempos[etapa] = deque(maxlen=self.janela)
+            self._tempos[etapa].append(segundos)
+
+            if self.caminho_log:
+                linha = {
+                    "momento": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+                    "sessao": sessao,
+                    "execucao": execucao,
+                    "etapa": etapa,
+                    "segundos": round(segundos, 6),
+                }
+                try:
+                    with open(self.caminho_log, "a", encoding="utf-8") as arquivo:
+                        arquivo.write(json.dumps(linha, ensure_ascii=False) + "\n")
+                except OSError:
+                    # Sem permissão de escrita: segue só com a memória
+                    self.caminho_log = None
+
+    def percentis(self):
+        """Tabela com medições e percentis (em ms) de cada etapa"""
+        with self._trava:
+            tempos = {etapa: np.array(valores) for etapa, valores in self._tempos.items()}
+
+        linhas = []
+        for etapa, valores in tempos.items():
+            linha = {"Etapa": etapa, "Medições": len(valores)}
+            for p, valor in zip(PERCENTIS, np.percentile(valores, PERCENTIS)):
+                linha[f"p{p} (ms)"] = round(valor * 1000, 1)
+            linhas.append(linha)
+        return pd.DataFrame(linhas, columns=["Etapa", "Medições"] + [f"p{p} (ms)" for p in PERCENTIS])
+
+
+# ---------- MEDIÇÃO DE UMA EXECUÇÃO ----------
+class MedicaoExecucao:
+    """Tempos das etapas de uma execução do script.
+
+    Os fragmentos reexecutados depois continuam gravando na medição da última
+    execução completa, substituindo o tempo da própria etapa.
+    """
+
+    def __init__(self, registro, sessao, execucao):
+        self.registro = registro
+        self.sessao = sessao
+        self.execucao = execucao
+        self.tempos = {}
+
+    @contextmanager
+    def etapa(self, nome):
+        """Mede o bloco `with` e registra o tempo com o nome da etapa"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nome, time.perf_counter() - inicio)
+
+    def registrar(self, nome, segundos):
+        """Registra um tempo medido fora de um bloco `with`"""
+        self.tempos[nome] = segundos
+        self.registro.registrar(self.sessao, self.execucao, nome, segundos)
+
+    def tabela(self):
+        """Tempos (em ms) das etapas desta execução, na ordem em que rodaram"""
+        return pd.DataFrame({
+            "Etapa": list(self.tempos),
+            "Tempo (ms)": [round(s * 1000, 1) for s in self.tempos.values()],
+        })
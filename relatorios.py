@@ -0,0 +1,279 @@
+"""Relatórios HTML estáticos por Região de Saúde e por hospital, sem navegador.
+
+Carrega os dados uma vez (planilha ou dados fictícios), monta para cada região
+e/ou hospital as mesmas figuras das visualizações do app.py, com as métricas e
+a análise estatística, e grava um arquivo HTML independente por combinação.
+Os relatórios são gerados em paralelo, um processo por núcleo, e os que já
+estão atualizados (mesmo hash do conteúdo) são pulados.
+
+Uso:
+    python relatorios.py
+    python relatorios.py --planilha vagas.xlsx --saida relatorios --por regiao
+    python relatorios.py --escala "~100 mil linhas" --processos 4 --plotlyjs cdn
+"""
+import argparse
+import hashlib
+import html
+import os
+import re
+import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import plotly
+
+from dados import (
+    DIMENSOES, ESCALAS_DADOS_FICTICIOS, SEMENTE_PADRAO,
+    CuboAgregacao, IndiceFiltros, gerar_dados_ficticios, importar_planilha, resumo_estatistico,
+)
+from graficos import (
+    figura_barras, figura_barras_empilhadas, figura_mapa_calor,
+    figura_pizza_cargo, figura_pizza_regiao, figura_treemap,
+)
+
+# Muda quando o layout do relatório muda, para regerar os arquivos existentes
+VERSAO_RELATORIO = "1"
+
+# Opção de --por -> dimensão filtrada, prefixo do arquivo e agrupamento do gráfico de barras
+RECORTES = {
+    "regiao": ("Região de Saúde", "regiao", "Município"),
+    "hospital": ("Hospital", "hospital", "Cargo"),
+}
+
+# Lido só no início do arquivo, para saber se o relatório está atualizado
+PADRAO_HASH = re.compile(r'<meta name="hash-conteudo" content="([0-9a-f]+)">')
+
+ESTILO = """
+body { font-family: sans-serif; margin: 2rem auto; max-width: 1200px; color: #262730; }
+.metricas { display: flex; gap: 1rem; margin: 1.5rem 0; }
+.metrica { flex: 1; padding: 1rem; border: 1px solid #e6e9ef; border-radius: 0.5rem; }
+.metrica span { display: block; color: #808495; font-size: 0.9rem; }
+.metrica strong { font-size: 1.8rem; }
+.colunas { display: flex; gap: 2rem; }
+.colunas > div { flex: 1; }
+table { border-collapse: collapse; }
+th, td { padding: 0.25rem 0.75rem; border-bottom: 1px solid #e6e9ef; text-align: left; }
+.vazio, .gerado { color: #808495; }
+"""
+
+
+# ---------- COMBINAÇÕES ----------
+def nome_arquivo(texto):
+    """Nome de arquivo seguro: sem acentos, minúsculo, só letras, números e hífens"""
+    sem_acentos = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "-", sem_acentos.lower()).strip("-") or "sem-nome"
+
+def combinacoes(df, recortes):
+    """(recorte, valor, nome do arquivo) de cada valor das dimensões pedidas, em ordem alfabética"""
+    usados = set()
+    resultado = []
+    for recorte in recortes:
+        dimensao, prefixo, _ = RECORTES[recorte]
+        for valor in sorted(df[dimensao].unique()):
+            # Nomes que só diferem na pontuação ganham um sufixo numérico
+            base = f"{prefixo}-{nome_arquivo(valor)}"
+            arquivo, n = f"{base}.html", 1
+            while arquivo in usados:
+                n += 1
+                arquivo = f"{base}-{n}.html"
+            usados.add(arquivo)
+            resultado.append((recorte, valor, arquivo))
+    return resultado
+
+def compactar(df):
+    """Só as categorias usadas, para enviar a parte filtrada a outro processo"""
+    return df.assign(**{
+        col: df[col].cat.remove_unused_categories()
+        for col in DIMENSOES if isinstance(df[col].dtype, pd.CategoricalDtype)
+    })
+
+def hash_relatorio(df_filtrado, *contexto):
+    """Hash dos dados filtrados e de tudo mais que muda o HTML gerado"""
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(df_filtrado, index=False).to_numpy().tobytes())
+    h.update("\x00".join(map(str, contexto)).encode("utf-8"))
+    return h.hexdigest()
+
+def hash_existente(caminho):
+    """Hash gravado num relatório já gerado, ou None"""
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            encontrado = PADRAO_HASH.search(arquivo.read(2048))
+    except OSError:
+        return None
+    return encontrado.group(1) if encontrado else None
+
+
+# ---------- MONTAGEM DO HTML ----------
+def montar_html(titulo, cubo, agrupar_por, hash_conteudo, plotlyjs):
+    """Página HTML com métricas, as cinco visualizações e a análise estatística"""
+    # O plotly.js entra uma única vez, junto com a primeira figura
+    incluir_js = [plotlyjs]
+
+    def figura(fig, vazio):
+        if fig is None:
+            return f'<p class="vazio">{html.escape(vazio)}</p>'
+        trecho = fig.to_html(full_html=False, include_plotlyjs=incluir_js[0])
+        incluir_js[0] = False
+        return trecho
+
+    def tabela(df):
+        return df.to_html(index=False, border=0)
+
+    resumo = resumo_estatistico(cubo)
+    metricas = [
+        ("Total de Vagas", resumo["total_vagas"]),
+        ("Hospitais", resumo["hospitais"]),
+        ("Municípios", resumo["municipios"]),
+        ("Cargos", resumo["cargos"]),
+    ]
+    estatisticas = [
+        ("Média de vagas por município", f"{resumo['media']:.1f}"),
+        ("Mediana de vagas por município", f"{resumo['mediana']:.1f}"),
+        ("Mínimo", resumo["minimo"]),
+        ("Máximo", resumo["maximo"]),
+    ]
+
+    partes = [
+        "<!DOCTYPE html>",
+        '<html lang="pt-BR"><head><meta charset="utf-8">',
+        f'<meta name="hash-conteudo" content="{hash_conteudo}">',
+        f"<title>{html.escape(titulo)}</title><style>{ESTILO}</style></head><body>",
+        f"<h1>🏥 {html.escape(titulo)}</h1>",
+        f'<p class="gerado">Gerado em {datetime.now():%d/%m/%Y %H:%M}</p>',
+        '<div class="metricas">',
+        *(f'<div class="metrica"><span>{nome}</span><strong>{valor}</strong></div>' for nome, valor in metricas),
+        "</div>",
+        "<h2>📊 Total de Vagas por Categoria</h2>",
+        figura(figura_barras(cubo, agrupar_por), "Sem dados para o gráfico de barras"),
+        "<h2>🔥 Mapa de Calor: Vagas por Região de Saúde e Cargo</h2>",
+        figura(figura_mapa_calor(cubo), "Sem dados para o mapa de calor"),
+        "<h2>🥧 Distribuição Percentual de Vagas</h2>",
+        '<div class="colunas"><div>',
+        figura(figura_pizza_regiao(cubo), "Sem dados para região"),
+        "</div><div>",
+        figura(figura_pizza_cargo(cubo), "Sem dados para cargo"),
+        "</div></div>",
+        "<h2>📚 Composição de Cargos por Município</h2>",
+        figura(figura_barras_empilhadas(cubo), "Sem dados para as barras empilhadas"),
+        "<h2>🌳 Hierarquia Região &gt; Município</h2>",
+        figura(figura_treemap(cubo), "Sem dados suficientes para treemap"),
+        "<h2>📈 Análise Estatística</h2>",
+        '<div class="colunas"><div>',
+        "<h3>Municípios com mais vagas</h3>", tabela(resumo["top_municipios"]),
+        "<h3>Cargos com mais vagas</h3>", tabela(resumo["top_cargos"]),
+        "</div><div>",
+        "<h3>Estatísticas Gerais</h3>",
+        tabela(pd.DataFrame(estatisticas, columns=["Estatística", "Valor"])),
+        "</div></div>",
+        "</body></html>",
+    ]
+    return "\n".join(partes)
+
+def gerar_relatorio(caminho, titulo, df_filtrado, agrupar_por, hash_conteudo, plotlyjs):
+    """Grava um relatório (roda nos processos do pool); devolve o tempo gasto"""
+    inicio = time.perf_counter()
+    conteudo = montar_html(titulo, CuboAgregacao(df_filtrado), agrupar_por, hash_conteudo, plotlyjs)
+
+    # Arquivo temporário + rename: um relatório interrompido não fica pela metade
+    temporario = Path(f"{caminho}.tmp")
+    temporario.write_text(conteudo, encoding="utf-8")
+    os.replace(temporario, caminho)
+    return time.perf_counter() - inicio
+
+def gravar_indice(saida, titulo_dados, itens):
+    """index.html com os links de todos os relatórios, agrupados por recorte"""
+    partes = [
+        "<!DOCTYPE html>",
+        '<html lang="pt-BR"><head><meta charset="utf-8">',
+        f"<title>Relatórios - {html.escape(titulo_dados)}</title><style>{ESTILO}</style></head><body>",
+        f"<h1>🏥 Relatórios de Vagas - {html.escape(titulo_dados)}</h1>",
+        f'<p class="gerado">Atualizado em {datetime.now():%d/%m/%Y %H:%M}</p>',
+    ]
+    for recorte in RECORTES:
+        links = [(valor, arquivo) for r, valor, arquivo in itens if r == recorte]
+        if links:
+            partes.append(f"<h2>{RECORTES[recorte][0]} ({len(links)})</h2><ul>")
+            partes += [f'<li><a href="{arquivo}">{html.escape(str(valor))}</a></li>' for valor, arquivo in links]
+            partes.append("</ul>")
+    partes.append("</body></html>")
+    (saida / "index.html").write_text("\n".join(partes), encoding="utf-8")
+
+
+# ---------- EXECUÇÃO ----------
+def carregar_dados(args):
+    """(df, descrição) da planilha indicada ou dos dados fictícios"""
+    if args.planilha:
+        caminho = Path(args.planilha)
+        df, relatorio_erros, mensagem = importar_planilha(caminho.read_bytes(), caminho.name)
+        if df is None:
+            sys.exit(f"Erro no formato: {mensagem}")
+        if relatorio_erros is not None:
+            print(f"⚠️ {len(relatorio_erros)} problemas encontrados; as linhas com erro foram ignoradas.")
+        print(f"ℹ️ {mensagem}")
+        return df, caminho.name
+    df = gerar_dados_ficticios(args.semente, **ESCALAS_DADOS_FICTICIOS[args.escala])
+    return df, f"Dados fictícios ({args.escala})"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--planilha", help="planilha .xlsx ou .csv (padrão: dados fictícios)")
+    parser.add_argument("--escala", default=next(iter(ESCALAS_DADOS_FICTICIOS)), choices=list(ESCALAS_DADOS_FICTICIOS),
+                        help="escala dos dados fictícios")
+    parser.add_argument("--semente", type=int, default=SEMENTE_PADRAO, help="semente dos dados fictícios")
+    parser.add_argument("--saida", default="relatorios", help="pasta dos arquivos HTML")
+    parser.add_argument("--por", default=",".join(RECORTES),
+                        help=f"recortes separados por vírgula (padrão: {','.join(RECORTES)})")
+    parser.add_argument("--processos", type=int, default=os.cpu_count(), help="processos em paralelo (padrão: um por núcleo)")
+    parser.add_argument("--plotlyjs", choices=["embutido", "cdn"], default="embutido",
+                        help="plotly.js dentro de cada arquivo (funciona offline) ou carregado da CDN")
+    parser.add_argument("--forcar", action="store_true", help="regera também os relatórios atualizados")
+    args = parser.parse_args()
+
+    recortes = [r.strip() for r in args.por.split(",") if r.strip()]
+    desconhecidos = [r for r in recortes if r not in RECORTES]
+    if desconhecidos:
+        parser.error(f"recortes desconhecidos: {desconhecidos} (use {list(RECORTES)})")
+
+    inicio = time.perf_counter()
+    df, titulo_dados = carregar_dados(args)
+    saida = Path(args.saida)
+    saida.mkdir(parents=True, exist_ok=True)
+    plotlyjs = True if args.plotlyjs == "embutido" else "cdn"
+
+    # O processo principal filtra e calcula os hashes; só os relatórios
+    # desatualizados vão para o pool
+    indice = IndiceFiltros(df)
+    itens = combinacoes(df, recortes)
+    pendentes = []
+    for recorte, valor, arquivo in itens:
+        dimensao, _, agrupar_por = RECORTES[recorte]
+        df_filtrado = compactar(indice.aplicar(df, {dimensao: [valor]}))
+        titulo = f"{dimensao}: {valor}"
+        hash_conteudo = hash_relatorio(df_filtrado, VERSAO_RELATORIO, plotly.__version__, args.plotlyjs, titulo, agrupar_por)
+        caminho = saida / arquivo
+        if args.forcar or hash_existente(caminho) != hash_conteudo:
+            pendentes.append((caminho, titulo, df_filtrado, agrupar_por, hash_conteudo, plotlyjs))
+    print(f"{len(itens)} relatórios: {len(pendentes)} a gerar, {len(itens) - len(pendentes)} já atualizados")
+
+    if args.processos <= 1:
+        for tarefa in pendentes:
+            gerar_relatorio(*tarefa)
+    elif pendentes:
+        with ProcessPoolExecutor(max_workers=args.processos) as executor:
+            futuros = [executor.submit(gerar_relatorio, *tarefa) for tarefa in pendentes]
+            for n, futuro in enumerate(as_completed(futuros), start=1):
+                futuro.result()
+                if n % 50 == 0 or n == len(futuros):
+                    print(f"  {n}/{len(futuros)} gerados", flush=True)
+
+    gravar_indice(saida, titulo_dados, itens)
+    print(f"Relatórios em {saida}/index.html ({time.perf_counter() - inicio:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()